@@ -0,0 +1,161 @@
+PLAYER = "player"
+BANKER = "banker"
+COMPLETE = "complete"
+NO_THIRD_CARD = 10  # player_third key used while the player still has two cards
+
+# Player draws a third card on 0-5 and stands on 6-7 (8-9 is a natural)
+PLAYER_DRAWS = tuple(total <= 5 for total in range(10))
+
+
+def _banker_draws(banker_total, player_third):
+    if player_third == NO_THIRD_CARD:
+        return banker_total <= 5  # player stood, banker follows the player's rule
+    if banker_total <= 2:
+        return True
+    if banker_total == 3:
+        return player_third != 8
+    if banker_total == 4:
+        return 2 <= player_third <= 7
+    if banker_total == 5:
+        return 4 <= player_third <= 7
+    if banker_total == 6:
+        return player_third in (6, 7)
+    return False
+
+
+# BANKER_DRAWS[banker_total][player_third], player_third being NO_THIRD_CARD if the player stood
+BANKER_DRAWS = tuple(tuple(_banker_draws(banker, third) for third in range(11)) for banker in range(10))
+
+
+def _next_after_deal(player_total, banker_total, player_third):
+    # Any 8 or 9 on the table ends the coup (the running totals are checked, as the table always has)
+    if player_total >= 8 or banker_total >= 8:
+        return COMPLETE
+    if player_third == NO_THIRD_CARD:
+        if PLAYER_DRAWS[player_total]:
+            return PLAYER
+        return BANKER if BANKER_DRAWS[banker_total][NO_THIRD_CARD] else COMPLETE
+    return BANKER if BANKER_DRAWS[banker_total][player_third] else COMPLETE
+
+
+# Who gets the next card once the first four are out, flattened and keyed by
+# (player total, banker total, player third-card value or NO_THIRD_CARD)
+NEXT_CARD = tuple(
+    _next_after_deal(player, banker, third)
+    for player in range(10) for banker in range(10) for third in range(11)
+)
+
+
+def next_card(player_total, banker_total, player_third=NO_THIRD_CARD):
+    return NEXT_CARD[(player_total * 10 + banker_total) * 11 + player_third]
+
+
+class Coup:
+    """Baccarat values and running totals of the hand being dealt, updated as cards arrive.
+
+    This is the single source of truth for the drawing rules in every game mode: in VIP mode
+    it holds the real cards behind the face-down placeholders."""
+
+    def __init__(self):
+        self.player = []
+        self.banker = []
+        self.player_total = 0
+        self.banker_total = 0
+
+    def reset(self):
+        self.player.clear()
+        self.banker.clear()
+        self.player_total = 0
+        self.banker_total = 0
+
+    def add(self, side, value):
+        """Record a card of baccarat value `value` dealt to `side`."""
+        if side == PLAYER:
+            self.player.append(value)
+            self.player_total = (self.player_total + value) % 10
+        else:
+            self.banker.append(value)
+            self.banker_total = (self.banker_total + value) % 10
+
+    def pop(self, side):
+        values = self.player if side == PLAYER else self.banker
+        if not values:
+            return
+        value = values.pop()
+        if side == PLAYER:
+            self.player_total = (self.player_total - value) % 10
+        else:
+            self.banker_total = (self.banker_total - value) % 10
+
+    @property
+    def cards_dealt(self):
+        return len(self.player) + len(self.banker)
+
+    def next_recipient(self):
+        """PLAYER, BANKER or COMPLETE for the hand as it stands."""
+        dealt = self.cards_dealt
+        if dealt < 4:
+            return PLAYER if dealt % 2 == 0 else BANKER
+        if dealt == 4:
+            return next_card(self.player_total, self.banker_total)
+        if dealt == 5 and len(self.player) == 3:
+            return next_card(self.player_total, self.banker_total, self.player[2])
+        return COMPLETE
+
+
+def _reference_next_recipient(player, banker):
+    """The original if/elif tableau, kept only to check the lookup tables against."""
+    total_cards = len(player) + len(banker)
+    if total_cards < 4:
+        return PLAYER if total_cards % 2 == 0 else BANKER
+    player_score = sum(player) % 10
+    banker_score = sum(banker) % 10
+    if player_score >= 8 or banker_score >= 8:
+        return COMPLETE
+    if total_cards == 4 and player_score <= 5:
+        return PLAYER
+    if total_cards == 4 and player_score >= 6 and banker_score <= 5:
+        return BANKER
+    if total_cards == 5 and len(player) == 3:
+        player_third = player[2]
+        if banker_score <= 2:
+            return BANKER
+        elif banker_score == 3 and player_third != 8:
+            return BANKER
+        elif banker_score == 4 and player_third in [2, 3, 4, 5, 6, 7]:
+            return BANKER
+        elif banker_score == 5 and player_third in [4, 5, 6, 7]:
+            return BANKER
+        elif banker_score == 6 and player_third in [6, 7]:
+            return BANKER
+        else:
+            return COMPLETE
+    return COMPLETE
+
+
+def self_check():
+    """Deal every reachable sequence of card values through Coup and compare each decision,
+    including undoing every card, with the reference tableau. Returns the number of states checked."""
+    coup = Coup()
+    checked = 0
+
+    def walk():
+        nonlocal checked
+        expected = _reference_next_recipient(coup.player, coup.banker)
+        actual = coup.next_recipient()
+        assert actual == expected, (coup.player, coup.banker, actual, expected)
+        assert coup.player_total == sum(coup.player) % 10 and coup.banker_total == sum(coup.banker) % 10
+        checked += 1
+        if actual == COMPLETE:
+            return
+        for value in range(10):
+            coup.add(actual, value)
+            walk()
+            coup.pop(actual)
+
+    walk()
+    return checked
+
+
+if __name__ == "__main__":
+    print(f"Drawing tables agree with the reference tableau in all {self_check()} reachable states")
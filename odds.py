@@ -0,0 +1,304 @@
+import random
+import time
+from fractions import Fraction
+
+from baccarat_rules import BANKER, COMPLETE, NEXT_CARD, PLAYER, Coup, next_card
+
+# Ranks in the same order as Shoe.rank_counts(), with their baccarat values
+RANK_VALUES = (1, 2, 3, 4, 5, 6, 7, 8, 9, 0, 0, 0, 0)
+TEN_RANKS = (9, 10, 11, 12)  # T J Q K, the only value class holding more than one rank
+
+PLAYER_WIN, BANKER_WIN, TIE = 0, 1, 2
+# Winner and Super Six flag of a finished coup, keyed by player total * 10 + banker total
+WINNER = tuple(
+    PLAYER_WIN if player > banker else (BANKER_WIN if banker > player else TIE)
+    for player in range(10) for banker in range(10)
+)
+SUPER_SIX = tuple(banker == 6 and banker > player for player in range(10) for banker in range(10))
+# Who gets the fifth card once the first four are out, keyed the same way
+AFTER_DEAL = tuple(next_card(player, banker) for player in range(10) for banker in range(10))
+
+ODDS_CACHE_SIZE = 4096  # compositions remembered; a shoe passes through at most 416 of them
+_cache = {}  # value-class composition -> _composition_odds() result
+
+
+def next_hand_odds(rank_counts):
+    """Exact probabilities for the next coup dealt from a shoe holding `rank_counts` (A..K).
+
+    Returns a dict with player, banker, tie, super_six, player_pair and banker_pair, or None
+    if fewer than six cards are left. Pairs are scored the way calculate_result() stores
+    them: the side's first two cards share a rank and it did not draw a third card."""
+    composition = _value_composition(rank_counts)
+    odds = _cache.get(composition)
+    if odds is None:
+        odds = _composition_odds(composition)
+        _remember(composition, odds)
+    return _combine(rank_counts, composition, odds)
+
+
+def cached_next_hand_odds(rank_counts):
+    """Like next_hand_odds, but only from the cache: returns None if this composition has not
+    been evaluated yet. Cheap enough to call on every broadcast."""
+    composition = _value_composition(rank_counts)
+    odds = _cache.get(composition)
+    if odds is None:
+        return None
+    return _combine(rank_counts, composition, odds)
+
+
+def prefetch_odds(rank_counts):
+    """Evaluate every composition one card (deal or burn) away from this one, so the lookup
+    after that card is a cache hit. Undo returns to a composition that is already cached.
+    Returns how many had to be computed."""
+    composition = _value_composition(rank_counts)
+    computed = 0
+    for value in range(10):
+        if not composition[value]:
+            continue
+        counts = list(composition)
+        counts[value] -= 1
+        neighbour = tuple(counts)
+        if neighbour not in _cache:
+            _remember(neighbour, _composition_odds(neighbour))
+            computed += 1
+    return computed
+
+
+def _value_composition(rank_counts):
+    value_counts = [0] * 10
+    for rank, count in enumerate(rank_counts):
+        value_counts[RANK_VALUES[rank]] += count
+    return tuple(value_counts)
+
+
+def _remember(composition, odds):
+    if len(_cache) >= ODDS_CACHE_SIZE:
+        del _cache[next(iter(_cache))]  # oldest first
+    _cache[composition] = odds
+
+
+def _combine(rank_counts, value_counts, odds):
+    if odds is None:
+        return None
+    player, banker, tie, super_six, player_pairs, banker_pairs = odds
+
+    # Values 1-9 are a single rank each; two tens only pair if they are the same picture
+    tens = value_counts[0]
+    same_ten = 0.0
+    if tens > 1:
+        same_ten = sum(rank_counts[rank] * (rank_counts[rank] - 1) for rank in TEN_RANKS) / (tens * (tens - 1))
+    return {
+        "player": player,
+        "banker": banker,
+        "tie": tie,
+        "super_six": super_six,
+        "player_pair": sum(player_pairs[1:]) + player_pairs[0] * same_ten,
+        "banker_pair": sum(banker_pairs[1:]) + banker_pairs[0] * same_ten,
+    }
+
+
+def _composition_odds(counts):
+    """Exact outcome probabilities for one composition of the ten value classes.
+
+    The first four cards are enumerated as unordered player and banker pairs, and their
+    weights are folded per (player total, banker total). The third cards are drawn from the
+    shoe minus those four cards, which only shifts each draw probability by how many of that
+    value were dealt, so per totals cell it is enough to keep the summed weight (W), the
+    weighted count of each value dealt (R) and, for cells where both sides may draw, the
+    weighted count of each ordered pair of dealt values (Q). Everything is counted in
+    integers over N(N-1)...(N-5) ordered deals, so the result is exact up to the final division.
+
+    Pair probabilities come back per value class (index 0 holds tens, not yet split by rank)."""
+    total = sum(counts)
+    if total < 6:
+        return None
+    c = counts
+    n4 = total - 4
+    n5 = total - 5
+    weight = [0] * 100
+    removed = [None] * 100
+    dealt_pairs = [None] * 100
+    player_pairs = [0] * 10
+    banker_pairs = [0] * 10
+    banker_pair_draws = []  # (weight, player total, banker total, dealt values) of banker pairs where the player draws
+
+    for a in range(10):
+        ca = c[a]
+        if not ca:
+            continue
+        for b in range(a, 10):
+            cb = c[b] - (b == a)
+            if cb <= 0:
+                continue
+            player_weight = ca * cb * (1 if a == b else 2)
+            player_total = (a + b) % 10
+            for d in range(10):
+                cd = c[d] - (d == a) - (d == b)
+                if cd <= 0:
+                    continue
+                for e in range(d, 10):
+                    ce = c[e] - (e == a) - (e == b) - (e == d)
+                    if ce <= 0:
+                        continue
+                    w = player_weight * cd * ce * (1 if d == e else 2)
+                    banker_total = (d + e) % 10
+                    key = player_total * 10 + banker_total
+                    weight[key] += w
+                    following = AFTER_DEAL[key]
+                    if following != COMPLETE:
+                        r = removed[key]
+                        if r is None:
+                            r = removed[key] = [0] * 10
+                        r[a] += w
+                        r[b] += w
+                        r[d] += w
+                        r[e] += w
+                    if following == PLAYER:
+                        q = dealt_pairs[key]
+                        if q is None:
+                            q = dealt_pairs[key] = [0] * 100
+                        for x in (a, b, d, e):
+                            row = x * 10
+                            q[row + a] += w
+                            q[row + b] += w
+                            q[row + d] += w
+                            q[row + e] += w
+                    if a == b and following != PLAYER:
+                        player_pairs[a] += w * n4 * n5
+                    if d == e:
+                        if following == COMPLETE:
+                            banker_pairs[d] += w * n4 * n5
+                        elif following == PLAYER:
+                            banker_pair_draws.append((w, player_total, banker_total, (a, b, d, e)))
+
+    settled = [0, 0, 0]
+    super_six = 0
+
+    for key in range(100):
+        w = weight[key]
+        if not w:
+            continue
+        player_total, banker_total = divmod(key, 10)
+        following = AFTER_DEAL[key]
+        if following == COMPLETE:
+            num = w * n4 * n5
+            settled[WINNER[key]] += num
+            if SUPER_SIX[key]:
+                super_six += num
+            continue
+        r = removed[key]
+        if following == BANKER:
+            for y in range(10):
+                num = (w * c[y] - r[y]) * n5
+                final = player_total * 10 + (banker_total + y) % 10
+                settled[WINNER[final]] += num
+                if SUPER_SIX[final]:
+                    super_six += num
+            continue
+        q = dealt_pairs[key]
+        for x in range(10):
+            player_final = (player_total + x) % 10
+            first = w * c[x] - r[x]
+            if NEXT_CARD[(player_final * 10 + banker_total) * 11 + x] != BANKER:
+                num = first * n5
+                final = player_final * 10 + banker_total
+                settled[WINNER[final]] += num
+                if SUPER_SIX[final]:
+                    super_six += num
+                continue
+            row = x * 10
+            for y in range(10):
+                # sum over deals of w * (c[x] - r[x]) * (c[y] - r[y] - (x == y))
+                num = w * c[x] * c[y] - c[x] * r[y] - c[y] * r[x] + q[row + y]
+                if x == y:
+                    num -= first
+                final = player_final * 10 + (banker_total + y) % 10
+                settled[WINNER[final]] += num
+                if SUPER_SIX[final]:
+                    super_six += num
+
+    # A banker pair only counts if the banker stood after the player's third card
+    for w, player_total, banker_total, dealt in banker_pair_draws:
+        stands = 0
+        for x in range(10):
+            if NEXT_CARD[((player_total + x) % 10 * 10 + banker_total) * 11 + x] != BANKER:
+                stands += c[x] - dealt.count(x)
+        banker_pairs[dealt[2]] += w * stands * n5
+
+    denominator = total * (total - 1) * (total - 2) * (total - 3) * n4 * n5
+    return (
+        settled[PLAYER_WIN] / denominator,
+        settled[BANKER_WIN] / denominator,
+        settled[TIE] / denominator,
+        super_six / denominator,
+        tuple(count / denominator for count in player_pairs),
+        tuple(count / denominator for count in banker_pairs),
+    )
+
+
+def _reference_odds(rank_counts):
+    """Deal every card sequence through Coup with exact fractions; slow, only for self_check."""
+    counts = list(rank_counts)
+    coup = Coup()
+    ranks = {PLAYER: [], BANKER: []}
+    totals = {key: Fraction(0) for key in ("player", "banker", "tie", "super_six", "player_pair", "banker_pair")}
+
+    def deal(probability):
+        recipient = coup.next_recipient()
+        if recipient == COMPLETE:
+            key = coup.player_total * 10 + coup.banker_total
+            totals[("player", "banker", "tie")[WINNER[key]]] += probability
+            if SUPER_SIX[key]:
+                totals["super_six"] += probability
+            for side, name in ((PLAYER, "player_pair"), (BANKER, "banker_pair")):
+                if len(ranks[side]) == 2 and ranks[side][0] == ranks[side][1]:
+                    totals[name] += probability
+            return
+        left = sum(counts)
+        for rank in range(13):
+            if not counts[rank]:
+                continue
+            chance = probability * Fraction(counts[rank], left)
+            counts[rank] -= 1
+            ranks[recipient].append(rank)
+            coup.add(recipient, RANK_VALUES[rank])
+            deal(chance)
+            coup.pop(recipient)
+            ranks[recipient].pop()
+            counts[rank] += 1
+
+    deal(Fraction(1))
+    return {key: float(value) for key, value in totals.items()}
+
+
+def self_check(trials=5, cards=16, seed=1):
+    """Compare next_hand_odds with brute-force enumeration on a few small random shoes."""
+    rng = random.Random(seed)
+    for _ in range(trials):
+        rank_counts = [0] * 13
+        for _ in range(cards):
+            rank_counts[rng.randrange(13)] += 1
+        expected = _reference_odds(rank_counts)
+        actual = next_hand_odds(rank_counts)
+        for key, value in expected.items():
+            assert abs(actual[key] - value) < 1e-12, (rank_counts, key, actual[key], value)
+    return trials
+
+
+if __name__ == "__main__":
+    print(f"Exact odds agree with brute-force enumeration on {self_check()} random shoes")
+    full_shoe = [32] * 13
+    _cache.clear()
+    started = time.perf_counter()
+    odds = next_hand_odds(full_shoe)
+    print(f"Fresh 8-deck shoe: {(time.perf_counter() - started) * 1000:.1f} ms")
+    started = time.perf_counter()
+    computed = prefetch_odds(full_shoe)
+    print(f"Prefetching {computed} neighbouring compositions: {(time.perf_counter() - started) * 1000:.1f} ms")
+    full_shoe[0] -= 1
+    started = time.perf_counter()
+    cached_next_hand_odds(full_shoe)
+    print(f"Cached lookup after dealing an ace: {(time.perf_counter() - started) * 1e6:.1f} us")
+    full_shoe[0] += 1
+    for key, value in odds.items():
+        print(f"  {key:12} {value:.6f}")
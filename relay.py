@@ -0,0 +1,303 @@
+import argparse
+import asyncio
+import json
+import logging
+import time
+import urllib.parse
+from collections import deque
+
+import websockets
+
+# Read-only relay for lobby boards and overhead displays: it holds one connection per table to
+# the authoritative server and re-fans that table's frames to any number of spectators, so the
+# dealer's server sends each frame once however many screens are watching
+RELAY_UPSTREAM = "ws://192.168.2.190:6789"
+RELAY_HOST = "0.0.0.0"
+RELAY_PORT = 6790
+DEFAULT_TABLE = "main"
+
+SEND_TIMEOUT = 2.0  # seconds a spectator may take to accept a frame before it is dropped
+UPSTREAM_RETRY_DELAY = 0.5  # first reconnect delay, doubled up to UPSTREAM_MAX_RETRY_DELAY
+UPSTREAM_MAX_RETRY_DELAY = 30.0
+REPLAY_BUFFER_FRAMES = 256  # recent frames per table kept for spectators that resume
+
+# Frames passed on to spectators; replies meant for the relay itself are not
+RELAYED_ACTIONS = ("game_state", "game_result", "stats")
+# Everything else a spectator sends is rejected, in particular every dealer action
+READ_ONLY_ACTIONS = ("set_protocol", "resync", "resume", "get_stats", "join_table", "get_metrics")
+
+logging.basicConfig(level=logging.INFO)
+logging.getLogger('websockets').setLevel(logging.WARNING)
+
+client_protocols = {}  # websocket -> "delta"; spectators not listed get full game_state frames
+
+
+async def send_frame(websocket, payload):
+    """Send an already-encoded frame to one spectator, giving up after SEND_TIMEOUT."""
+    try:
+        await asyncio.wait_for(websocket.send(payload), SEND_TIMEOUT)
+        return True
+    except asyncio.TimeoutError:
+        logging.warning(f"Spectator {websocket.remote_address} did not take a frame within {SEND_TIMEOUT}s, dropping it")
+        asyncio.ensure_future(websocket.close())
+        return False
+    except websockets.exceptions.ConnectionClosed:
+        return False
+
+
+async def send_error(websocket, message):
+    await send_frame(websocket, json.dumps({"action": "error", "message": message}))
+
+
+class TableFeed:
+    """One table's upstream subscription and the spectators watching it.
+
+    The relay subscribes with the full protocol, so it sees every game_state version. Full
+    frames are passed on to spectators as received; spectators on the delta protocol get a
+    game_state_delta built here against the previous version, with the server's version numbers,
+    so their gap detection works exactly as it does against the server. Relayed frames keep
+    the server's seq, and the recent ones are buffered so spectators can resume here too."""
+
+    def __init__(self, upstream, table_id):
+        self.url = f"{upstream.rstrip('/')}/{urllib.parse.quote(table_id)}"
+        self.table_id = table_id
+        self.clients = set()
+        self.snapshot = None  # latest game_state message, decoded
+        self.snapshot_payload = None  # and as received
+        self.stats_payload = None
+        self.recent_frames = deque(maxlen=REPLAY_BUFFER_FRAMES)  # (seq, audience, payload)
+        self.connected = False
+        self.rejected = None  # the server's error if it does not host this table
+        self.task = None
+        self.metrics = {"frames_in": 0, "frames_out": 0, "clients_dropped": 0, "reconnects": 0, "last_fanout_ms": 0.0}
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def run(self):
+        retry_delay = UPSTREAM_RETRY_DELAY
+        while True:
+            try:
+                async with websockets.connect(self.url) as upstream:
+                    self.connected = True
+                    self.snapshot = None  # versions restart if the server did, so take the next frame as the base
+                    retry_delay = UPSTREAM_RETRY_DELAY
+                    logging.info(f"Relaying table {self.table_id} from {self.url}")
+                    await upstream.send(json.dumps({"action": "get_stats"}))
+                    async for payload in upstream:
+                        await self.on_frame(payload)
+            except (OSError, websockets.exceptions.WebSocketException) as e:
+                if not self.rejected:
+                    logging.error(f"Upstream {self.url} unavailable, retrying in {retry_delay}s: {e}")
+            finally:
+                self.connected = False
+            if self.rejected:
+                await self.close(self.rejected)
+                return
+            self.metrics["reconnects"] += 1
+            await asyncio.sleep(retry_delay)
+            retry_delay = min(retry_delay * 2, UPSTREAM_MAX_RETRY_DELAY)
+
+    async def on_frame(self, payload):
+        self.metrics["frames_in"] += 1
+        message = json.loads(payload)
+        action = message.get("action")
+        if action == "error":
+            logging.warning(f"Upstream {self.url}: {message.get('message')}")
+            if str(message.get("message", "")).startswith("Unknown table"):
+                self.rejected = message["message"]
+            return
+        if action not in RELAYED_ACTIONS:
+            return
+        seq = message.get("seq")
+        if action == "stats":
+            self.stats_payload = payload
+        if action != "game_state":
+            if seq is not None:
+                self.recent_frames.append((seq, "all", payload))
+            await self.fan_out(payload, self.clients)
+            return
+
+        previous = self.snapshot
+        self.snapshot = message
+        self.snapshot_payload = payload
+        if seq is not None:
+            self.recent_frames.append((seq, "full", payload))
+        if previous is None:
+            # First frame of this subscription: everyone needs it, delta spectators as their base
+            await self.fan_out(payload, self.clients)
+            return
+        full_clients = [websocket for websocket in self.clients if client_protocols.get(websocket) != "delta"]
+        delta_clients = [websocket for websocket in self.clients if client_protocols.get(websocket) == "delta"]
+        await self.fan_out(payload, full_clients)
+        if previous.get("version") == message.get("version"):
+            return
+        changes = {key: value for key, value in message.items()
+                   if key not in ("action", "version", "seq") and previous.get(key) != value}
+        delta = json.dumps({
+            "action": "game_state_delta",
+            "version": message.get("version"),
+            "base_version": previous.get("version"),
+            "changes": changes,
+            "seq": seq
+        })
+        if seq is not None:
+            self.recent_frames.append((seq, "delta", delta))
+        await self.fan_out(delta, delta_clients)
+
+    async def fan_out(self, payload, clients):
+        clients = list(clients)
+        if not clients:
+            return
+        started = time.perf_counter()
+        results = await asyncio.gather(*(send_frame(websocket, payload) for websocket in clients))
+        dropped = {websocket for websocket, sent in zip(clients, results) if not sent}
+        self.clients.difference_update(dropped)
+        self.metrics["frames_out"] += len(clients) - len(dropped)
+        self.metrics["clients_dropped"] += len(dropped)
+        self.metrics["last_fanout_ms"] = (time.perf_counter() - started) * 1000
+
+    async def join(self, websocket):
+        """Add a spectator and send it the latest frames; False if the table turned out not to exist."""
+        if self.rejected:
+            await send_error(websocket, self.rejected)
+            await websocket.close()
+            return False
+        self.clients.add(websocket)
+        await self.send_snapshot(websocket)
+        return True
+
+    async def send_snapshot(self, websocket):
+        """Latest game_state and stats for a spectator that joined or asked to resync."""
+        if self.snapshot_payload:
+            await send_frame(websocket, self.snapshot_payload)
+        if self.stats_payload:
+            await send_frame(websocket, self.stats_payload)
+
+    async def resume(self, websocket, last_seq):
+        """Replay what a reconnecting spectator missed after `last_seq`, or a snapshot if the
+        frames are no longer buffered here."""
+        audience = "delta" if client_protocols.get(websocket) == "delta" else "full"
+        oldest = self.recent_frames[0][0] if self.recent_frames else None
+        latest = self.recent_frames[-1][0] if self.recent_frames else None
+        if not isinstance(last_seq, int) or oldest is None or not oldest <= last_seq <= latest:
+            await send_frame(websocket, json.dumps({"action": "resume", "snapshot": True, "replayed": 0, "seq": latest}))
+            await self.send_snapshot(websocket)
+            return
+        missed = [payload for seq, frame_audience, payload in self.recent_frames
+                  if seq > last_seq and frame_audience in ("all", audience)]
+        await send_frame(websocket, json.dumps({"action": "resume", "snapshot": False, "replayed": len(missed), "seq": latest}))
+        for payload in missed:
+            if not await send_frame(websocket, payload):
+                break
+
+    async def close(self, reason):
+        """Stop relaying a table the server does not host: forget the feed and send its
+        spectators away with the server's error, as the server itself would."""
+        if feeds.get(self.table_id) is self:
+            del feeds[self.table_id]
+        logging.warning(f"Dropping feed for table {self.table_id}: {reason}")
+        clients, self.clients = list(self.clients), set()
+        for websocket in clients:
+            await send_error(websocket, reason)
+            asyncio.ensure_future(websocket.close())
+
+    def stats(self):
+        return {**self.metrics, "clients": len(self.clients), "upstream_connected": self.connected,
+                "version": self.snapshot.get("version") if self.snapshot else None}
+
+
+upstream_url = RELAY_UPSTREAM
+feeds = {}  # table id -> TableFeed, subscribed when the first spectator asks for the table and
+           # dropped if the server does not host it
+
+
+def feed_for(table_id):
+    feed = feeds.get(table_id)
+    if feed is None:
+        feed = feeds[table_id] = TableFeed(upstream_url, table_id)
+        feed.start()
+    return feed
+
+
+def requested_table(websocket):
+    """Table id from the URL path the spectator connected with; "/" means DEFAULT_TABLE."""
+    return urllib.parse.unquote(urllib.parse.urlsplit(websocket.request.path).path.strip("/")) or DEFAULT_TABLE
+
+
+async def handle_spectator(websocket):
+    feed = feed_for(requested_table(websocket))
+    try:
+        if not await feed.join(websocket):
+            return
+
+        async for message in websocket:
+            try:
+                data = json.loads(message)
+            except json.JSONDecodeError:
+                await send_error(websocket, "Invalid JSON")
+                continue
+            if not isinstance(data, dict):
+                await send_error(websocket, "Invalid message")
+                continue
+            action = data.get("action")
+            if action not in READ_ONLY_ACTIONS:
+                await send_error(websocket, f"Read-only spectator connection, {action} is not allowed")
+                continue
+
+            table_id = data.get("table")
+            if table_id is not None and table_id != feed.table_id:
+                feed.clients.discard(websocket)
+                feed = feed_for(table_id)
+                if not await feed.join(websocket):
+                    return
+                continue
+
+            if action == "set_protocol":
+                protocol = data.get("protocol", "full")
+                if protocol == "delta":
+                    client_protocols[websocket] = "delta"
+                elif protocol == "full":
+                    client_protocols.pop(websocket, None)
+                else:
+                    await send_error(websocket, f"Unknown protocol: {protocol}")
+                    continue
+                await feed.send_snapshot(websocket)
+            elif action == "resync":
+                await feed.send_snapshot(websocket)
+            elif action == "resume":
+                if data.get("protocol") == "delta":
+                    client_protocols[websocket] = "delta"
+                await feed.resume(websocket, data.get("last_seq"))
+            elif action == "get_stats":
+                if feed.stats_payload:
+                    await send_frame(websocket, feed.stats_payload)
+            elif action == "get_metrics":
+                await send_frame(websocket, json.dumps({
+                    "action": "metrics",
+                    "relay": {table: other.stats() for table, other in feeds.items()}
+                }))
+    except websockets.exceptions.ConnectionClosed:
+        pass
+    finally:
+        feed.clients.discard(websocket)
+        client_protocols.pop(websocket, None)
+
+
+async def main():
+    global upstream_url
+    parser = argparse.ArgumentParser(description="Read-only relay of baccarat table frames for display screens")
+    parser.add_argument("--upstream", default=RELAY_UPSTREAM, help="authoritative server, e.g. ws://192.168.2.190:6789")
+    parser.add_argument("--host", default=RELAY_HOST)
+    parser.add_argument("--port", type=int, default=RELAY_PORT)
+    args = parser.parse_args()
+    upstream_url = args.upstream
+
+    feed_for(DEFAULT_TABLE)  # subscribe up front so the first screen gets a snapshot straight away
+    async with websockets.serve(handle_spectator, args.host, args.port):
+        print(f"Spectator relay running on ws://{args.host}:{args.port}, upstream {upstream_url}")
+        await asyncio.Future()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
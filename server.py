@@ -1,122 +1,708 @@
+import argparse
 import asyncio
+import bisect
+import contextvars
 import websockets
 import json
 import logging
-import random
+import multiprocessing
+import os
+import queue
 import serial
+import socket
+import struct
+import tempfile
+import threading
 import time
 import urllib.parse
-import re
-from collections import defaultdict, deque
+import zlib
+import bson
+from contextlib import asynccontextmanager
+from collections import deque
+from itertools import islice
+from bson import ObjectId
 from motor.motor_asyncio import AsyncIOMotorClient
-from pymongo.errors import ServerSelectionTimeoutError
+from pymongo import DESCENDING, IndexModel
+from pymongo.errors import BulkWriteError, ConnectionFailure
 from datetime import datetime
+from baccarat_rules import BANKER, PLAYER
+from table import CUT_CARD, GameError, Table
+from odds import cached_next_hand_odds, next_hand_odds, prefetch_odds
+from shoe_protocol import BURN, DEAL, SHOE_END, ShoeParser
 
 # MongoDB Configuration
 MONGO_URI = "mongodb://localhost:27017"
 DB_NAME = "game_db"
 COLLECTION_NAME = "game_results"
 
-client = AsyncIOMotorClient(MONGO_URI)
+client = AsyncIOMotorClient(MONGO_URI, serverSelectionTimeoutMS=2000)
 db = client[DB_NAME]
-collection = db[COLLECTION_NAME]
-
-# Serial connection for shoe reader
-try:
-    ser = serial.Serial("COM1", 9600, timeout=0.1)  # Adjust baud rate if necessary
-    logging.info(f"Connected to shoe reader on {ser.name}")
-except Exception as e:
-    logging.error(f"Failed to connect to shoe reader: {e}")
-    ser = None
-
-def extract_card_value(input_string):
-    """
-    Extract the card value from the input string formatted like:
-    [Manual Burn Cards]<Card:{data}>
-    """
-    match = re.search(r"<Card:(.*?)>", input_string)
-    return match.group(1) if match else None
-
-async def read_from_serial():
-    """Continuously reads card values from the casino shoe reader and adds them to the game.
+
+# Tables hosted by this process: table id -> its own game_results collection and shoe reader
+# port (None for a table without one). Clients pick a table with the URL path they connect to
+# (ws://host:6789/<table id>) or a "table" field in any message; "/" is DEFAULT_TABLE
+TABLES = {
+    "main": {"collection": COLLECTION_NAME, "serial_port": "COM1"},
+}
+DEFAULT_TABLE = "main"
+
+# Index backing the hot game_results query (latest entry for undo/delete and the bead plate)
+GAME_RESULTS_INDEXES = [
+    IndexModel([("timestamp", DESCENDING)], name="timestamp_desc"),
+]
+
+# Write-behind persistence of game results
+PERSIST_BATCH_SIZE = 100  # max documents per insert_many
+PERSIST_FLUSH_INTERVAL = 0.05  # seconds a queued result may wait for others to join its batch
+PERSIST_RETRY_DELAY = 0.5  # first retry delay after a failed flush, doubled up to PERSIST_MAX_RETRY_DELAY
+PERSIST_MAX_RETRY_DELAY = 30.0
+DUPLICATE_KEY_ERROR = 11000
+
+# Local write-ahead logs, one per collection (<collection>.wal): every journal entry is appended
+# there first, so results survive a MongoDB outage or a server restart and are replayed into
+# the collection once it is reachable
+WAL_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Storage latency budget: the longest any single MongoDB call may take (seconds). find_one is
+# awaited by undo/delete on the game path; everything else runs in the background
+DB_DEADLINES = {
+    "ping": 2.0,
+    "find_one": 0.5,
+    "distinct": 5.0,
+    "insert_many": 5.0,
+    "delete_one": 2.0,
+    "delete_many": 5.0,
+    "aggregate": 10.0,
+    "create_indexes": 10.0,
+    "explain": 5.0,
+}
+# Circuit breaker: open after this many consecutive failures, allow one trial call after the reset timeout
+BREAKER_FAILURE_THRESHOLD = 3
+BREAKER_RESET_TIMEOUT = 5.0
+RECENT_STORED_CACHE = 50  # newest stored results remembered so undo/delete can find them without MongoDB
+
+# Hot queries explained at startup to catch a missing index: (name, filter, sort)
+HOT_QUERIES = [
+    ("latest entry", {}, [("timestamp", DESCENDING)]),
+]
+
+SHOE_RETRY_DELAY = 1.0  # seconds the reader thread waits after a serial error before reading again
+# Set to a directory to keep the raw bytes of each table's shoe reader (<table id>.bin), which
+# `python shoe_protocol.py <file>` replays through the frame parser
+SHOE_CAPTURE_DIR = None
+
+def open_serial(port):
+    """Serial connection for a table's shoe reader, or None if it cannot be opened."""
+    try:
+        # Adjust baud rate if necessary; the timeout is how long a line may stay unterminated
+        ser = serial.Serial(port, 9600, timeout=0.1)
+        logging.info(f"Connected to shoe reader on {ser.name}")
+        return ser
+    except Exception as e:
+        logging.error(f"Failed to connect to shoe reader on {port}: {e}")
+        return None
+
+class ShoeReader:
+    """A table's shoe reader, read on its own thread so a slow or stuck serial driver never
+    blocks the event loop.
+
+    The thread runs every read through a shoe_protocol.ShoeParser and hands the frames it
+    completed to the loop through `batches`, in order and together with the perf_counter()
+    time of the read, so a card reaches the table as soon as its frame is complete."""
+
+    def __init__(self, ser, loop, capture_path=None):
+        self.ser = ser
+        self.loop = loop
+        self.parser = ShoeParser()
+        self.capture_path = capture_path
+        self.batches = asyncio.Queue()  # (frames, read time)
+        self.latency = LatencyHistogram()  # card read -> its game_state broadcast, ms
+        self.metrics = {"batches": 0, "cards": 0, "rejected": 0, "read_errors": 0}
+        self.thread = threading.Thread(target=self._reader, name=f"shoe-reader-{ser.name}", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def _reader(self):
+        capture = open(self.capture_path, "ab") if self.capture_path else None
+        while True:
+            try:
+                data = self.ser.read(self.ser.in_waiting or 1)  # waits up to the port timeout
+            except Exception as e:
+                self.metrics["read_errors"] += 1
+                logging.error(f"Error reading from serial: {e}")
+                time.sleep(SHOE_RETRY_DELAY)
+                continue
+            if not data:
+                continue  # the port went quiet; a line only ends at its newline
+            read_at = time.perf_counter()
+            if capture:
+                capture.write(data)
+                capture.flush()
+            frames = self.parser.feed(data)
+            if frames:
+                self.loop.call_soon_threadsafe(self.batches.put_nowait, (frames, read_at))
+
+    def stats(self):
+        return {**self.metrics, "frames": dict(self.parser.counts), "queued": self.batches.qsize(),
+                "latency": self.latency.stats()}
+
+async def handle_shoe_frames(host, frames):
+    """Apply the frames of one shoe reader read to the table, in order. Returns the number of
+    cards the table took."""
+    taken = 0
+    for frame in frames:
+        if frame.kind == DEAL:
+            # Works exactly like manual card entry (a burn while the dealer has burn mode on)
+            logging.info(f"Table {host.table_id}: card {frame.card} read from the shoe")
+            if await handle_add_card(host, None, frame.card):
+                taken += 1
+        elif frame.kind == BURN:
+            logging.info(f"Table {host.table_id}: burn card {frame.card} read from the shoe")
+            try:
+                host.table.burn(frame.card)
+            except GameError as e:
+                logging.warning(f"Table {host.table_id}: burn card {frame.card} from the shoe refused: {e}")
+                continue
+            taken += 1
+            await host.broadcast_game_state()
+        elif frame.kind == SHOE_END:
+            logging.info(f"Table {host.table_id}: shoe reader reports the end of the shoe ({frame.detail})")
+        else:
+            logging.warning(f"Table {host.table_id}: shoe reader error: {frame.detail}")
+    return taken
+
+async def read_from_serial(host, ser):
+    """Continuously reads card values from the table's shoe reader and adds them to its game.
     This is just an automated input method for Live and VIP modes (not Manual mode)."""
     if not ser:
         logging.warning("Serial connection not available, skipping shoe reader")
         return
     
+    capture_path = os.path.join(SHOE_CAPTURE_DIR, f"{host.table_id}.bin") if SHOE_CAPTURE_DIR else None
+    reader = host.shoe_reader = ShoeReader(ser, asyncio.get_running_loop(), capture_path)
+    reader.start()
     while True:
+        frames, read_at = await reader.batches.get()
+        reader.metrics["batches"] += 1
+        cards = sum(1 for frame in frames if frame.card)
         try:
-            if ser.in_waiting > 0:
-                raw_data = ser.readline().decode("utf-8").strip()
-                card = extract_card_value(raw_data)
-                print(f"Card read from shoe: {card}")
-                if card:
-                    # Shoe reader is just an automated input method for Live/VIP modes
-                    # Works exactly like manual card entry but automated
-                    await handle_add_card(None, card, is_auto_deal=False)
-                    await broadcast_game_state()
+            # One command per read: the cards go in order and share one game_state frame
+            taken = await host.commands.submit("shoe_frames", lambda: handle_shoe_frames(host, frames))
         except Exception as e:
-            logging.error(f"Error reading from serial: {e}")
-        await asyncio.sleep(0.1)  # Adjust delay if necessary
+            logging.error(f"Error applying shoe reader frames: {e}")
+            continue
+        reader.metrics["cards"] += taken
+        reader.metrics["rejected"] += cards - taken
+        if taken:
+            # The command has flushed its game_state frame by the time it returns
+            reader.latency.record((time.perf_counter() - read_at) * 1000)
 
 # Configure logging to suppress websocket handshake errors
 logging.basicConfig(level=logging.INFO)
 logging.getLogger('websockets.server').setLevel(logging.WARNING)
 logging.getLogger('websockets').setLevel(logging.WARNING)
 
-# Track connected clients
-connected_clients = set()
-
-# Game state - SIMPLIFIED
-game_state = {
-    "round": 0,
-    "game_phase": "waiting",
-    "natural_win": False,
-    "natural_type": None,
-    "can_calculate": False,
-    "burn_mode": "inactive",  # inactive, active, completed
-    "burn_available": False,  # NEW: controls when start burn is enabled
-    "active_players": set(),
-    "auto_dealing": False,
-    "can_manage_players": True,
-    "table_number": "FT-",
-    "max_bet": 100000,
-    "min_bet": 10000,
-    "game_mode": "manual",
-    "vip_player_revealer": None,  # NEW: separate revealers
-    "vip_banker_revealer": None,  # NEW: separate revealers
-    "cards_revealed": False,  
-    "winner": None
-}
-
-remaining_cards = None
-card_duplicates = defaultdict(int)
-last_card_info = {"card": None, "recipient": None}
-last_game_result = None
-player_cards = []
-banker_cards = []
-dummy_player_cards = []  # For dummy player in VIP mode
-dummy_banker_cards = []  # For dummy banker in VIP mode
-burn_card = None
-burned_cards = []  # Track all burned cards in the current round
-
-game_pairs = {
-    "player_pair": False,
-    "banker_pair": False
-}
-game_results = {
-    "is_super_six": False
+# Broadcast fan-out settings and per-broadcast timings
+SEND_TIMEOUT = 2.0  # seconds a single client may take to accept a frame before it is dropped
+broadcast_metrics = {
+    "broadcasts": 0,
+    "frames_sent": 0,
+    "clients_dropped": 0,
+    "last_encode_ms": 0.0,
+    "last_send_ms": 0.0,
+    "max_send_ms": 0.0
 }
 
-async def check_connection():
+# Protocol each client chose with set_protocol; versions and snapshots are kept per TableHost
+client_protocols = {}  # websocket -> "delta"; clients not listed get full game_state frames
+
+# Broadcast coalescing: outside of a client action, game_state changes made within this
+# window are collapsed into one frame (0 flushes at the end of the current event-loop tick)
+BROADCAST_COALESCE_WINDOW = 0.005
+
+# Command queue: every action that touches a table runs through its ordered queue, one at a
+# time. Latency (queue wait + run time) is counted per command in these buckets (ms); command
+# names beyond COMMAND_METRICS_MAX_NAMES share one "other" histogram
+COMMAND_LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+COMMAND_METRICS_MAX_NAMES = 64
+
+# Auto-deal cadence (seconds): pause after each dealt card and after the reshuffle at the cut
+# card. Tables can change it with set_auto_deal_speed, where 0 is turbo mode for testing
+AUTO_DEAL_CARD_DELAY = 2.5
+AUTO_DEAL_SHUFFLE_DELAY = 2.5
+AUTO_DEAL_MAX_DELAY = 30.0
+
+# Connection onboarding: a new client gets the current game_state on its own, and clients that
+# connect within this window of each other (a reconnect storm) share one encoded snapshot
+ADMISSION_WINDOW = 0.02
+
+# Frames broadcast to a table's clients are numbered per table ("seq") and the most recent ones
+# are kept, so a client that reconnects can resume from the last seq it saw
+REPLAY_BUFFER_FRAMES = 256
+
+# Live odds: exact next-hand probabilities for the current shoe ride along in game_state,
+# rounded to this many decimals
+ODDS_DECIMALS = 6
+
+# How often the in-memory stats are checked against MongoDB for drift (seconds)
+STATS_RECONCILE_INTERVAL = 300
+
+# Worker mode (server.py --workers N, Linux only): N processes share the listening port through
+# SO_REUSEPORT and each table's game runs in exactly one of them. Workers exchange client
+# commands and encoded broadcast frames over a Unix-socket hub run by the supervising process.
+# A bus frame is a BUS_HEADER (body length, destination worker or BUS_ALL) followed by the body:
+# a JSON envelope, a newline and the raw frame or message text it carries
+BUS_HEADER = struct.Struct(">Ii")
+BUS_ALL = -1
+worker_bus = None  # this process's WorkerBus in worker mode
+
+# Every hosted table runs its own shoe, hand, round and mode. All game rules live in table.Table;
+# the handlers below only translate client actions into Table calls and publish the outcome
+SHOE_DECKS = 8
+
+async def check_connection(database):
     try:
-        await client.admin.command('ping')
+        await database.ping()
         logging.info("Connected to MongoDB successfully.")
-    except ServerSelectionTimeoutError as e:
+        return True
+    except (asyncio.TimeoutError, ConnectionFailure, CircuitOpenError) as e:
         logging.error("Could not connect to MongoDB: %s", e)
-        exit(1)
+        logging.warning("Continuing without MongoDB; results are kept in the local WAL until it is reachable")
+        return False
 
-async def save_game_result(winner, round_num, is_super_six=False, player_pair=False, banker_pair=False, player_natural=False, banker_natural=False):
+async def ensure_indexes(database):
+    try:
+        names = await database.create_indexes(GAME_RESULTS_INDEXES)
+        logging.info(f"{database.collection.name} indexes ensured: {', '.join(names)}")
+    except Exception as e:
+        logging.error(f"Error creating {database.collection.name} indexes: {e}")
+
+def plan_stages(plan):
+    """Yield every stage name in an explain() plan tree, whatever the server version nests it under."""
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from plan_stages(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            yield from plan_stages(value)
+
+async def check_query_plans(database):
+    """Explain each hot query and log the ones MongoDB would answer with a collection scan."""
+    for name, query, sort in HOT_QUERIES:
+        try:
+            explain = await database.explain(query, sort)
+            stages = set(plan_stages(explain.get("queryPlanner", {}).get("winningPlan", {})))
+            if "COLLSCAN" in stages:
+                logging.warning(f"Hot query '{name}' {query} falls back to COLLSCAN, check {database.collection.name} indexes")
+            else:
+                logging.info(f"Hot query '{name}' uses {', '.join(sorted(stages))}")
+        except Exception as e:
+            logging.error(f"Error explaining hot query '{name}': {e}")
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling MongoDB while the circuit breaker is open."""
+
+class CircuitBreaker:
+    """Guards every MongoDB call of the process, whichever table's collection it targets.
+
+    Each operation runs under its DB_DEADLINES budget. After BREAKER_FAILURE_THRESHOLD
+    consecutive connection failures or timeouts the breaker opens and calls fail fast with
+    CircuitOpenError; after BREAKER_RESET_TIMEOUT one trial call is let through (half-open)
+    and its outcome closes or re-opens the breaker."""
+
+    def __init__(self):
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.trial_running = False
+        self.metrics = {
+            "calls": 0,
+            "failures": 0,
+            "timeouts": 0,
+            "rejected": 0,
+            "opened": 0,
+            "half_opened": 0,
+            "closed": 0
+        }
+
+    def _transition(self, state):
+        logging.warning(f"MongoDB circuit breaker {self.state} -> {state}")
+        self.state = state
+        self.metrics[{"open": "opened", "half_open": "half_opened", "closed": "closed"}[state]] += 1
+        if state == "open":
+            self.opened_at = time.monotonic()
+
+    async def call(self, name, operation):
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < BREAKER_RESET_TIMEOUT:
+                self.metrics["rejected"] += 1
+                raise CircuitOpenError(f"MongoDB unavailable, {name} rejected")
+            self._transition("half_open")
+        if self.state == "half_open" and self.trial_running:
+            self.metrics["rejected"] += 1
+            raise CircuitOpenError(f"MongoDB unavailable, {name} rejected while a trial call is running")
+
+        trial = self.state == "half_open"
+        self.trial_running = trial
+        self.metrics["calls"] += 1
+        try:
+            result = await asyncio.wait_for(operation(), DB_DEADLINES[name])
+        except (asyncio.TimeoutError, ConnectionFailure) as e:
+            self.metrics["failures"] += 1
+            if isinstance(e, asyncio.TimeoutError):
+                self.metrics["timeouts"] += 1
+                e = asyncio.TimeoutError(f"MongoDB {name} exceeded its {DB_DEADLINES[name]}s budget")
+            self.consecutive_failures += 1
+            if trial or (self.state == "closed" and self.consecutive_failures >= BREAKER_FAILURE_THRESHOLD):
+                self._transition("open")
+            raise e
+        finally:
+            if trial:
+                self.trial_running = False
+        # Any answer from the server, including a rejected write, means it is reachable
+        self.consecutive_failures = 0
+        if trial:
+            self._transition("closed")
+        return result
+
+    def stats(self):
+        return {**self.metrics, "state": self.state}
+
+class DatabaseGateway:
+    """Single entry point for every MongoDB call on one table's collection. All gateways share
+    the client's connection pool and one CircuitBreaker, since they talk to the same server."""
+
+    def __init__(self, client, collection, breaker):
+        self.client = client
+        self.collection = collection
+        self.breaker = breaker
+
+    async def call(self, name, operation):
+        return await self.breaker.call(name, operation)
+
+    async def ping(self):
+        return await self.call("ping", lambda: self.client.admin.command("ping"))
+
+    async def find_one(self, query, sort=None):
+        return await self.call("find_one", lambda: self.collection.find_one(query, sort=sort))
+
+    async def stored_ids(self, ids):
+        """The ones among `ids` that are in the collection."""
+        return set(await self.call("distinct", lambda: self.collection.distinct("_id", {"_id": {"$in": ids}})))
+
+    async def insert_many(self, docs):
+        return await self.call("insert_many", lambda: self.collection.insert_many(docs, ordered=False))
+
+    async def delete_one(self, query):
+        return await self.call("delete_one", lambda: self.collection.delete_one(query))
+
+    async def delete_many(self, query):
+        return await self.call("delete_many", lambda: self.collection.delete_many(query))
+
+    async def aggregate(self, pipeline):
+        return await self.call("aggregate", lambda: self.collection.aggregate(pipeline).to_list(length=None))
+
+    async def create_indexes(self, indexes):
+        return await self.call("create_indexes", lambda: self.collection.create_indexes(indexes))
+
+    async def explain(self, query, sort=None):
+        cursor = self.collection.find(query).limit(1)
+        if sort:
+            cursor = cursor.sort(sort)
+        return await self.call("explain", cursor.explain)
+
+    def stats(self):
+        return {**self.breaker.stats(), "collection": self.collection.name}
+
+class WriteAheadLog:
+    """Append-only local log of journal entries, each stored as a 4-byte length, a 4-byte CRC32
+    and the BSON-encoded entry.
+
+    append() only hands the encoded record to a writer thread, which writes and fsyncs everything
+    that has accumulated in one go (group commit), so the event loop never waits on the disk."""
+
+    HEADER = struct.Struct(">II")
+    TRUNCATE = object()
+
+    def __init__(self, path):
+        self.path = path
+        self.queue = queue.SimpleQueue()
+        self.file = None
+        self.thread = None
+        self.metrics = {"records": 0, "fsyncs": 0, "last_fsync_ms": 0.0}
+
+    def replay(self):
+        """Return every intact record in the log. A torn or corrupt tail is cut off."""
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, "rb") as f:
+            data = f.read()
+        records = []
+        offset = 0
+        while offset + self.HEADER.size <= len(data):
+            length, crc = self.HEADER.unpack_from(data, offset)
+            start = offset + self.HEADER.size
+            end = start + length
+            if end > len(data) or zlib.crc32(data[start:end]) != crc:
+                break
+            records.append(bson.decode(data[start:end]))
+            offset = end
+        if offset != len(data):
+            logging.warning(f"Discarding {len(data) - offset} bytes of torn or corrupt WAL tail in {self.path}")
+            with open(self.path, "r+b") as f:
+                f.truncate(offset)
+        return records
+
+    def open(self):
+        self.file = open(self.path, "ab")
+        self.thread = threading.Thread(target=self._writer, name="wal-writer", daemon=True)
+        self.thread.start()
+
+    def append(self, record):
+        payload = bson.encode(record)
+        self.queue.put(self.HEADER.pack(len(payload), zlib.crc32(payload)) + payload)
+        self.metrics["records"] += 1
+
+    def checkpoint(self):
+        """Discard everything logged so far; called once all of it is stored in MongoDB."""
+        self.queue.put(self.TRUNCATE)
+
+    def _writer(self):
+        while True:
+            items = [self.queue.get()]
+            while True:
+                try:
+                    items.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                for item in items:
+                    if item is self.TRUNCATE:
+                        self.file.truncate(0)
+                    else:
+                        self.file.write(item)
+                started = time.perf_counter()
+                self.file.flush()
+                os.fsync(self.file.fileno())
+                self.metrics["fsyncs"] += 1
+                self.metrics["last_fsync_ms"] = (time.perf_counter() - started) * 1000
+            except OSError as e:
+                logging.error(f"Error writing WAL {self.path}: {e}")
+
+class WriteBehindJournal:
+    """Ordered in-memory journal of game_results writes, flushed to MongoDB by a background task.
+
+    Entries are ("insert", doc), ("delete", doc) or ("clear", None) and are applied strictly in
+    order. Each entry is appended to the write-ahead log before it is queued, and an entry leaves
+    the journal only once MongoDB has acknowledged it, so a failed batch is retried as-is.
+    Documents get their _id when queued, which makes retries and WAL replays idempotent and lets
+    undo/delete target a result whether or not it has reached MongoDB yet."""
+
+    def __init__(self, database, wal, on_flush=None):
+        self.database = database
+        self.wal = wal
+        self.on_flush = on_flush
+        self.on_ready = None  # awaited once, after the first flush that gets through to MongoDB
+        self.pending = deque()
+        self.in_flight = 0  # entries at the head of pending that are being written right now
+        # Newest documents known to be stored (oldest first); when recent_complete is set they are
+        # the whole collection. Lets latest() answer without MongoDB, including while the breaker is open
+        self.recent_stored = deque(maxlen=RECENT_STORED_CACHE)
+        self.recent_complete = False
+        self.lock = asyncio.Lock()  # one flush at a time
+        self.wakeup = asyncio.Event()
+        self.task = None
+        self.metrics = {
+            "queued": 0,
+            "flushed": 0,
+            "batches": 0,
+            "cancelled": 0,
+            "failures": 0,
+            "last_flush_ms": 0.0
+        }
+
+    def restore(self):
+        """Rebuild the journal from the WAL after a restart. Returns the entries MongoDB has not seen."""
+        for record in self.wal.replay():
+            if record["op"] == "insert":
+                self.pending.append(("insert", record["doc"]))
+            elif record["op"] == "delete":
+                self._delete(record["doc"])
+            elif record["op"] == "clear":
+                self._clear()
+        if self.pending:
+            logging.info(f"Replaying {len(self.pending)} journal entries from {self.wal.path}")
+        return list(self.pending)
+
+    def start(self):
+        self.wal.open()
+        self.task = asyncio.create_task(self.run())
+        if self.pending or self.on_ready:
+            self.wakeup.set()
+
+    def insert(self, doc):
+        doc.setdefault("_id", ObjectId())
+        self.wal.append({"op": "insert", "doc": doc})
+        self.pending.append(("insert", doc))
+        self.metrics["queued"] += 1
+        self.wakeup.set()
+        return doc["_id"]
+
+    def clear(self):
+        """Queue a wipe of game_results; inserts still waiting in the journal are dropped."""
+        self.wal.append({"op": "clear"})
+        self._clear()
+        self.wakeup.set()
+
+    def _clear(self):
+        head = list(islice(self.pending, self.in_flight))
+        self.metrics["cancelled"] += sum(1 for op, _ in islice(self.pending, self.in_flight, None) if op == "insert")
+        self.pending = deque(head)
+        self.pending.append(("clear", None))
+
+    def delete(self, doc):
+        """Remove a game: dropped from the journal if it is still queued, deleted from MongoDB otherwise."""
+        self.wal.append({"op": "delete", "doc": doc})
+        self._delete(doc)
+        self.wakeup.set()
+
+    def _delete(self, doc):
+        for index in range(self.in_flight, len(self.pending)):
+            op, queued = self.pending[index]
+            if op == "insert" and queued["_id"] == doc["_id"]:
+                del self.pending[index]
+                self.metrics["cancelled"] += 1
+                return
+        self.pending.append(("delete", doc))
+
+    async def unstored(self):
+        """The journal entries MongoDB has not applied yet. Right after a restart the WAL can still
+        hold entries MongoDB acknowledged just before the crash, so inserts already stored and
+        deletes already applied are looked up by _id and left out. Entries after a clear are all
+        kept, as the clear resets whatever they are counted on top of."""
+        ids = [doc["_id"] for op, doc in self.pending if op != "clear"]
+        stored = await self.database.stored_ids(ids) if ids else set()
+        checked = set(ids)  # anything queued while MongoDB was asked cannot be stored yet
+        entries = []
+        cleared = False
+        for op, doc in self.pending:
+            if op == "clear":
+                cleared = True
+            elif not cleared and doc["_id"] in checked and (doc["_id"] in stored) == (op == "insert"):
+                continue
+            entries.append((op, doc))
+        return entries
+
+    async def latest(self):
+        """Most recent game, whether still queued or already stored."""
+        deleted = []
+        for op, doc in reversed(self.pending):
+            if op == "insert":
+                return doc
+            if op == "clear":
+                return None  # everything stored will be wiped before anything newer lands
+            deleted.append(doc["_id"])
+        for doc in reversed(self.recent_stored):
+            if doc["_id"] not in deleted:
+                return doc
+        if self.recent_complete:
+            return None
+        doc = await self.database.find_one({"_id": {"$nin": deleted}}, sort=[("timestamp", DESCENDING)])
+        if doc and not deleted:
+            self._remember_stored([doc])
+        elif doc is None and not deleted:
+            self.recent_complete = True
+        return doc
+
+    def _remember_stored(self, docs):
+        """Add newly stored documents to recent_stored. Once older ones fall out of the cache it no
+        longer holds the whole collection, so latest() has to ask MongoDB when it runs out."""
+        if len(self.recent_stored) + len(docs) > RECENT_STORED_CACHE:
+            self.recent_complete = False
+        self.recent_stored.extend(docs)
+
+    def _forget_stored(self, doc_id):
+        for doc in self.recent_stored:
+            if doc["_id"] == doc_id:
+                self.recent_stored.remove(doc)
+                break
+
+    async def flush(self):
+        """Apply everything queued so far, in order. Returns the number of documents inserted."""
+        inserted = 0
+        async with self.lock:
+            while self.pending:
+                started = time.perf_counter()
+                op, doc = self.pending[0]
+                if op != "insert":
+                    self.in_flight = 1
+                    try:
+                        if op == "clear":
+                            await self.database.delete_many({})
+                            self.recent_stored.clear()
+                            self.recent_complete = True
+                            logging.info("MongoDB collection cleared")
+                        else:
+                            await self.database.delete_one({"_id": doc["_id"]})
+                            self._forget_stored(doc["_id"])
+                    finally:
+                        self.in_flight = 0
+                    self.pending.popleft()
+                    continue
+                batch = []
+                for op, doc in islice(self.pending, PERSIST_BATCH_SIZE):
+                    if op != "insert":
+                        break
+                    batch.append(doc)
+                self.in_flight = len(batch)
+                try:
+                    await self.database.insert_many(batch)
+                except BulkWriteError as e:
+                    # A retried batch may already be partly stored; only duplicate keys are acceptable
+                    if any(error.get("code") != DUPLICATE_KEY_ERROR for error in e.details.get("writeErrors", [])):
+                        raise
+                finally:
+                    self.in_flight = 0
+                for _ in batch:
+                    self.pending.popleft()
+                self._remember_stored(batch)
+                inserted += len(batch)
+                self.metrics["flushed"] += len(batch)
+                self.metrics["batches"] += 1
+                self.metrics["last_flush_ms"] = (time.perf_counter() - started) * 1000
+            # Everything logged so far is now in MongoDB
+            self.wal.checkpoint()
+        return inserted
+
+    async def run(self):
+        retry_delay = PERSIST_RETRY_DELAY
+        while True:
+            await self.wakeup.wait()
+            await asyncio.sleep(PERSIST_FLUSH_INTERVAL)  # let a burst of writes share one batch
+            self.wakeup.clear()
+            try:
+                inserted = await self.flush()
+                if self.on_ready:
+                    await self.on_ready()
+                    self.on_ready = None
+                retry_delay = PERSIST_RETRY_DELAY
+                if inserted and self.on_flush:
+                    await self.on_flush()
+            except Exception as e:
+                self.metrics["failures"] += 1
+                logging.error(f"Error flushing {len(self.pending)} queued writes to MongoDB, retrying in {retry_delay}s: {e}")
+                self.wakeup.set()
+                await asyncio.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, PERSIST_MAX_RETRY_DELAY)
+
+    def stats(self):
+        return {**self.metrics, "pending": len(self.pending), "wal": self.wal.metrics}
+
+async def save_game_result(host, winner, round_num, is_super_six=False, player_pair=False, banker_pair=False, player_natural=False, banker_natural=False):
+    """Journal the result for write-behind persistence; it is counted in the stats right away."""
     try:
         game_doc = {
             "timestamp": datetime.utcnow(),
@@ -128,29 +714,29 @@ async def save_game_result(winner, round_num, is_super_six=False, player_pair=Fa
             "player_natural": player_natural,  # New: separate natural tracking
             "banker_natural": banker_natural   # New: separate natural tracking
         }
-        result = await collection.insert_one(game_doc)
-        logging.info(f"Game {round_num} saved: {winner} wins - Super Six: {is_super_six}, Player Pair: {player_pair}, Banker Pair: {banker_pair}")
-        return result.inserted_id
+        inserted_id = host.results_journal.insert(game_doc)
+        host.stats_aggregator.add(game_doc)
+        logging.info(f"Table {host.table_id} game {round_num} saved: {winner} wins - Super Six: {is_super_six}, Player Pair: {player_pair}, Banker Pair: {banker_pair}")
+        return inserted_id
     except Exception as e:
-        logging.error(f"Error saving to MongoDB: {e}")
+        logging.error(f"Error saving game result: {e}")
         return None
 
-async def delete_last_game_entry(websocket):
+async def delete_last_game_entry(host, websocket):
     try:
-        last_entry = await collection.find_one(sort=[("timestamp", -1)])
+        last_entry = await host.results_journal.latest()
         
         if last_entry:
-            await collection.delete_one({"_id": last_entry["_id"]})
+            host.results_journal.delete(last_entry)
+            host.stats_aggregator.remove(last_entry)
             # No local stat restoration, just update round if needed
-            if last_entry.get("round") == game_state["round"]:
-                game_state["round"] = max(0, game_state["round"] - 1)
+            if host.table.forget_result(last_entry.get("round")):
                 await send_success(websocket, f"Deleted last game entry (Round {last_entry.get('round', 'Unknown')})")
             else:
                 await send_success(websocket, f"Deleted game entry: Round {last_entry.get('round', 'Unknown')}")
-            logging.info(f"Deleted game entry: Round {last_entry.get('round', 'Unknown')}")
-            await asyncio.sleep(1)
-            await broadcast_refresh_stats()
-            await broadcast_game_state()
+            logging.info(f"Table {host.table_id} deleted game entry: Round {last_entry.get('round', 'Unknown')}")
+            await host.broadcast_refresh_stats()
+            await host.broadcast_game_state()
             return True
         else:
             await send_error(websocket, "No entries found to delete")
@@ -161,770 +747,806 @@ async def delete_last_game_entry(websocket):
         await send_error(websocket, f"Error deleting entry: {str(e)}")
         return False
 
-# Create 8-deck shoe (416 cards total)
-def create_8_deck_shoe():
-    suits = ['H', 'D', 'C', 'S']
-    ranks = ['A', '2', '3', '4', '5', '6', '7', '8', '9', 'T', 'J', 'Q', 'K']
-    cards = [rank + suit for _ in range(8) for suit in suits for rank in ranks]
-    random.shuffle(cards)
-    return deque(cards)
-
-def card_value(card):
-    rank = card[0]
-    return 1 if rank == 'A' else (0 if rank in 'TJQK' else int(rank))
-
-def calculate_hand_score(cards):
-    return sum(card_value(card) for card in cards) % 10
-
-def has_pair(cards):
-    return len(cards) == 2 and cards[0][0] == cards[1][0]
-
-def is_valid_card(card):
-    return len(card) == 2 and card[0] in 'A23456789TJQK' and card[1] in 'HDCS'
-
-def can_add_card(card):
-    return card_duplicates[card] < 8
-
-def update_card_tracking(card, recipient, is_undo=False):
-    global remaining_cards, card_duplicates, last_card_info
-    
-    if is_undo:
-        card_duplicates[card] -= 1
-        if card_duplicates[card] <= 0:
-            del card_duplicates[card]
-        remaining_cards.append(card)
-        last_card_info = {"card": None, "recipient": None}
-    else:
-        if card in remaining_cards:
-            remaining_cards.remove(card)
-        card_duplicates[card] += 1
-        last_card_info.update({"card": card, "recipient": recipient})
-
-def new_round():
-    global player_cards, banker_cards, last_card_info, game_pairs, last_game_result,dummy_player_cards, dummy_banker_cards
-    player_cards = []
-    banker_cards = []
-    dummy_player_cards = []  # Reset dummy player cards for VIP mode
-    dummy_banker_cards = []  # Reset dummy banker cards for VIP mode
-    last_card_info = {"card": None, "recipient": None}
-    last_game_result = None
-    game_pairs = {"player_pair": False, "banker_pair": False}
-    game_results["is_super_six"] = False
-    global burned_cards
-    burned_cards = []
-    game_state["winner"] = None
-    
-    is_vip_mode = game_state.get("game_mode") == "vip"
-
-    # Reset both revealers and individual reveal states
-    if is_vip_mode:
-        game_state["vip_player_revealer"] = None
-        game_state["vip_banker_revealer"] = None
-        game_state["cards_revealed"] = False
-    
-    game_state.update({
-        "game_phase": "waiting",
-        "natural_win": False,
-        "natural_type": None,
-        "auto_dealing": False,
-        "cards_revealed": not is_vip_mode,
-        "can_manage_players": True,
-        "winner": None
-    })
-
-async def broadcast_refresh_stats():
-    if not connected_clients:
-        return
-    message = {"action": "refresh_stats"}
-    websockets_to_remove = set()
-    for websocket in connected_clients:
-        try:
-            await websocket.send(json.dumps(message))
-        except websockets.exceptions.ConnectionClosed:
-            websockets_to_remove.add(websocket)
-    connected_clients.difference_update(websockets_to_remove)
-
-async def reset_all():
-    global remaining_cards, card_duplicates, burn_card
-    remaining_cards = create_8_deck_shoe()
-    card_duplicates = defaultdict(int)
-    burn_card = None
-    global burned_cards
-    burned_cards = []
-    new_round()
+async def send_frame(websocket, payload):
+    """Send an already-encoded frame to one client, giving up after SEND_TIMEOUT."""
     try:
-        await collection.delete_many({})
-        logging.info("MongoDB collection cleared")
-    except Exception as e:
-        logging.error(f"Error clearing MongoDB: {e}")
-    # Deactivate all players
-    game_state["active_players"] = set()
-    game_state.update({
-        "round": 0,
-        "burn_mode": "inactive",
-        "burn_available": True,  # Enable burn after reset
-        "can_manage_players": True
-    })
-    await broadcast_refresh_stats()
-
-def has_unrevealed_cards():
-    """Check if there are any 'BR' cards remaining in player_cards or banker_cards"""
-    if 'BR' in player_cards or 'BR' in banker_cards:
+        await asyncio.wait_for(websocket.send(payload), SEND_TIMEOUT)
         return True
-    else:
+    except asyncio.TimeoutError:
+        logging.warning(f"Client {websocket.remote_address} did not take a frame within {SEND_TIMEOUT}s, dropping it")
+        # A cancelled send can leave a half-written frame behind, so the connection is unusable
+        asyncio.ensure_future(websocket.close())
+        return False
+    except websockets.exceptions.ConnectionClosed:
         return False
 
-def get_next_card_recipient():
-    if not game_state["auto_dealing"] and len(game_state["active_players"]) == 0:
-        return "no_players"
-
-    total_cards = len(player_cards) + len(banker_cards)
-
-    # Initial 4 cards dealing (2 player, 2 banker)
-    if total_cards < 4:
-        if total_cards % 2 == 0:
-            return "player"
-        else:
-            return "banker"
-
-    # In VIP mode, if we have 4 cards and any are unrevealed, MUST pause
-    if total_cards == 4 and game_state["game_mode"] == "vip" and has_unrevealed_cards():
-        return "waiting_for_reveal"  # New return value to indicate pause
-
-    # After 4 cards are dealt and revealed (or in non-VIP mode)
-    if total_cards >= 4:
-        # Use appropriate cards for calculation based on mode
-        if game_state["game_mode"] == "vip":
-            player_score = calculate_hand_score(dummy_player_cards)
-            banker_score = calculate_hand_score(dummy_banker_cards)
-        else:
-            player_score = calculate_hand_score(player_cards)
-            banker_score = calculate_hand_score(banker_cards)
-
-        # Natural win check (8 or 9)
-        if player_score >= 8 or banker_score >= 8:
-            return "complete"
-
-        # Player draws if 0-5
-        if total_cards == 4 and player_score <= 5:
-            return "player"
-        
-        # If player didn't draw (stood on 6-7), banker draws if 0-5
-        if total_cards == 4 and player_score >= 6 and banker_score <= 5:
-            return "banker"
-        
-        # If player drew a third card, banker follows drawing rules
-        if total_cards == 5 and len(player_cards) == 3:
-            # Get player's third card value
-            if game_state["game_mode"] == "vip":
-                player_third = card_value(dummy_player_cards[2])
+async def broadcast(message, clients, payload=None):
+    """Serialize message once (unless the encoded `payload` is given) and push it to `clients`
+    concurrently. Returns the clients that are closed or too slow, for the caller to forget."""
+    clients = list(clients)
+    if not clients:
+        return set()
+    started = time.perf_counter()
+    if payload is None:
+        payload = json.dumps(message)
+    encoded = time.perf_counter()
+
+    results = await asyncio.gather(*(send_frame(websocket, payload) for websocket in clients))
+    websockets_to_remove = {websocket for websocket, sent in zip(clients, results) if not sent}
+    finished = time.perf_counter()
+
+    encode_ms = (encoded - started) * 1000
+    send_ms = (finished - encoded) * 1000
+    broadcast_metrics["broadcasts"] += 1
+    broadcast_metrics["frames_sent"] += len(clients) - len(websockets_to_remove)
+    broadcast_metrics["clients_dropped"] += len(websockets_to_remove)
+    broadcast_metrics["last_encode_ms"] = encode_ms
+    broadcast_metrics["last_send_ms"] = send_ms
+    broadcast_metrics["max_send_ms"] = max(broadcast_metrics["max_send_ms"], send_ms)
+    logging.debug(f"Broadcast {message.get('action') if message else 'relayed frame'}: {len(payload)} bytes to {len(clients)} clients, "
+                  f"encode {encode_ms:.2f} ms, send {send_ms:.2f} ms")
+    return websockets_to_remove
+
+class BroadcastCoalescer:
+    """Dirty-flag scheduler that collapses repeated broadcast requests into one flush.
+
+    request() only marks state as changed. While an action holds the coalescer the flush
+    waits for the action to finish; otherwise it runs after BROADCAST_COALESCE_WINDOW."""
+
+    def __init__(self, flush_callback, window=BROADCAST_COALESCE_WINDOW):
+        self.flush_callback = flush_callback
+        self.window = window
+        self.dirty = False
+        self.holds = 0
+        self.timer = None
+        self.requested = 0
+        self.emitted = 0
+
+    def request(self):
+        self.requested += 1
+        self.dirty = True
+        if self.holds == 0 and self.timer is None:
+            loop = asyncio.get_running_loop()
+            if self.window > 0:
+                self.timer = loop.call_later(self.window, self._on_timer)
             else:
-                player_third = card_value(player_cards[2])
-
-            # Banker drawing rules based on banker total and player's third card
-            if banker_score <= 2:
-                return "banker"
-            elif banker_score == 3 and player_third != 8:
-                return "banker"
-            elif banker_score == 4 and player_third in [2, 3, 4, 5, 6, 7]:
-                return "banker"
-            elif banker_score == 5 and player_third in [4, 5, 6, 7]:
-                return "banker"
-            elif banker_score == 6 and player_third in [6, 7]:
-                return "banker"
-            else:
-                return "complete"
-
-    return "complete"
+                self.timer = loop.call_soon(self._on_timer)
+
+    def _on_timer(self):
+        self.timer = None
+        if self.holds == 0 and self.dirty:
+            asyncio.ensure_future(self.flush())
+
+    async def flush(self):
+        """Send now if anything changed since the last flush."""
+        if self.timer:
+            self.timer.cancel()
+            self.timer = None
+        if not self.dirty:
+            return
+        self.dirty = False
+        self.emitted += 1
+        await self.flush_callback()
+
+    @asynccontextmanager
+    async def hold(self):
+        """Defer flushing until the wrapped action completes, then flush once."""
+        self.holds += 1
+        try:
+            yield
+        finally:
+            self.holds -= 1
+            if self.holds == 0 and self.dirty:
+                await self.flush()
+
+    def counters(self):
+        return {
+            "requested": self.requested,
+            "emitted": self.emitted,
+            "suppressed": self.requested - self.emitted,
+        }
 
+class LatencyHistogram:
+    """Counts of latencies (ms) per COMMAND_LATENCY_BUCKETS_MS bucket, plus one overflow bucket."""
+
+    def __init__(self, buckets=COMMAND_LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, ms):
+        self.counts[bisect.bisect_left(self.buckets, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the given fraction of samples (max_ms for the overflow)."""
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return round(min(bound, self.max_ms), 3)
+        return round(self.max_ms, 3)
+
+    def stats(self):
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total_ms / self.count, 3) if self.count else None,
+            "p50_ms": self.percentile(0.5),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": round(self.max_ms, 3),
+            "buckets": dict(zip([f"<={bound}" for bound in self.buckets] + ["inf"], self.counts)),
+        }
 
-async def shuffle_deck(mode=None):
-    global remaining_cards, card_duplicates
-    remaining_cards = create_8_deck_shoe()
-    card_duplicates = defaultdict(int)
-    game_state["burn_mode"] = "inactive"
-    game_state["burn_available"] = True  # Enable burn after shuffle
-    logging.info(f"Deck shuffled - {len(remaining_cards)} cards available")
+class CommandQueue:
+    """Ordered queue of the commands that touch one table, run one at a time by a single task.
+
+    Client actions, cards from the shoe reader and auto-deal steps are all submitted here, so
+    a command that awaits (a MongoDB lookup, a broadcast) is never interleaved with another
+    one. Each command runs under `around()` (the table's broadcast hold), so it sends at most
+    one game_state frame. submit() waits for the command and returns its result or raises
+    its exception; a command whose submitter was cancelled before it started is skipped."""
+
+    def __init__(self, around):
+        self.around = around
+        self.queue = asyncio.Queue()
+        self.task = None
+        self.latency = {}  # command name -> LatencyHistogram of queue wait + run time
+        self.wait = LatencyHistogram()  # queue wait alone, all commands
+        self.metrics = {"submitted": 0, "completed": 0, "failed": 0, "skipped": 0, "max_depth": 0}
+
+    async def submit(self, name, command):
+        """Queue `command` (a coroutine function taking no arguments) and wait for it to run."""
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((name, command, future, time.perf_counter()))
+        self.metrics["submitted"] += 1
+        self.metrics["max_depth"] = max(self.metrics["max_depth"], self.queue.qsize())
+        return await future
+
+    async def run(self):
+        while True:
+            name, command, future, queued = await self.queue.get()
+            if future.done():
+                self.metrics["skipped"] += 1
+                continue
+            started = time.perf_counter()
+            self.wait.record((started - queued) * 1000)
+            try:
+                async with self.around():
+                    result = await command()
+            except Exception as e:
+                self.metrics["failed"] += 1
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                self.metrics["completed"] += 1
+                if not future.done():
+                    future.set_result(result)
+            self._histogram(name).record((time.perf_counter() - queued) * 1000)
+
+    def _histogram(self, name):
+        if name not in self.latency and len(self.latency) >= COMMAND_METRICS_MAX_NAMES:
+            name = "other"
+        if name not in self.latency:
+            self.latency[name] = LatencyHistogram()
+        return self.latency[name]
+
+    def stats(self):
+        return {
+            **self.metrics,
+            "depth": self.queue.qsize(),
+            "wait": self.wait.stats(),
+            "latency": {name: histogram.stats() for name, histogram in self.latency.items()},
+        }
 
-async def burn_card_from_deck():
-    global burn_card
-    
-    if len(remaining_cards) > 0:
-        burn_card = remaining_cards.popleft()
-        card_duplicates[burn_card] += 1
-        game_state["burn_enabled"] = False
-        logging.info(f"Burned card: {burn_card}")
-        return burn_card
-    return None
-
-async def handle_start_burn_card(websocket):
-    """Handle start burn card button"""
-    if game_state["auto_dealing"]:
-        await send_error(websocket, "Cannot start burn during auto-dealing")
-        return False
-    if not game_state["burn_available"]:
-        await send_error(websocket, "Burn card not available")
-        return False
-    if game_state["burn_mode"] != "inactive":
-        await send_error(websocket, "Burn mode already active")
-        return False
-    game_state["burn_mode"] = "active"
-    game_state["burn_available"] = False  # Immediately disable Start Burn button
-    await send_success(websocket, "Burn mode activated. Next cards will be burned.")
-    logging.info("Burn mode activated")
-    return True
+class LiveOdds:
+    """Exact next-hand odds for the current shoe, kept off the event loop.
+
+    current() is called while building game_state and never evaluates anything itself: it
+    looks the shoe's composition up in the odds cache. On a miss it keeps returning the last
+    known odds while a worker thread evaluates the new composition, then requests another
+    game_state frame through `on_change`. Once the odds are current, the worker prefetches every
+    composition one card away, so the next deal or burn is normally a cache hit. The odds cache
+    itself is shared by every table in the process."""
+
+    def __init__(self, on_change):
+        self.on_change = on_change
+        self.shoe = None
+        self.composition = None
+        self.odds = None
+        self.task = None
+        self.metrics = {"hits": 0, "misses": 0, "last_lookup_us": 0.0, "last_compute_ms": 0.0, "last_prefetch_ms": 0.0}
+
+    def current(self, shoe):
+        self.shoe = shoe
+        rank_counts = shoe.rank_counts()
+        composition = tuple(rank_counts)
+        if composition != self.composition:
+            started = time.perf_counter()
+            odds = cached_next_hand_odds(rank_counts)
+            self.metrics["last_lookup_us"] = round((time.perf_counter() - started) * 1e6, 1)
+            if odds is None:
+                self.metrics["misses"] += 1
+            else:
+                self.metrics["hits"] += 1
+                self.composition = composition
+                self.odds = self._rounded(odds)
+            if self.task is None:
+                self.task = asyncio.ensure_future(self._run())
+        return self.odds
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                rank_counts = self.shoe.rank_counts()
+                composition = tuple(rank_counts)
+                started = time.perf_counter()
+                if composition != self.composition:
+                    odds = await loop.run_in_executor(None, next_hand_odds, rank_counts)
+                    self.metrics["last_compute_ms"] = round((time.perf_counter() - started) * 1000, 2)
+                    self.composition = composition
+                    self.odds = self._rounded(odds)
+                    self.on_change()
+                    continue  # cards may have been dealt meanwhile
+                await loop.run_in_executor(None, prefetch_odds, rank_counts)
+                self.metrics["last_prefetch_ms"] = round((time.perf_counter() - started) * 1000, 2)
+                if tuple(self.shoe.rank_counts()) == composition:
+                    return
+        except Exception as e:
+            logging.error(f"Error computing live odds: {e}")
+        finally:
+            self.task = None
+
+    @staticmethod
+    def _rounded(odds):
+        if odds is None:
+            return None
+        return {key: round(value, ODDS_DECIMALS) for key, value in odds.items()}
+
+class TableHost:
+    """One hosted table: its game, the clients watching it and its own results collection.
+
+    Tables share the event loop, the MongoDB client and circuit breaker and the odds cache,
+    while game_state versions, broadcasts, stats and persistence are kept per table, so
+    nothing done at one table reaches another table's clients or collection."""
+
+    def __init__(self, table_id, database, serial_port=None):
+        self.table_id = table_id
+        self.serial_port = serial_port
+        self.shoe_reader = None  # ShoeReader, once read_from_serial() has opened the port
+        self.table = Table(decks=SHOE_DECKS)
+        self.clients = set()
+        self.state_version = 0
+        self.last_state_snapshot = None
+        # seq starts at the current time in milliseconds, so after a restart it is ahead of
+        # anything a client saw before and that client's resume falls back to a snapshot
+        self.seq = int(time.time() * 1000)
+        self.recent_frames = deque(maxlen=REPLAY_BUFFER_FRAMES)  # (seq, audience, payload)
+        self.admitting = []  # clients waiting for the next admission batch
+        self.admission = None
+        self.admission_metrics = {"batches": 0, "admitted": 0, "last_batch": 0}
+        self.action_metrics = ActionMetrics()
+        self.auto_dealer = AutoDealer(self)
+        self.state_broadcasts = BroadcastCoalescer(self.flush_game_state)
+        # Every action that touches the table (client, shoe reader or auto-deal step) runs
+        # through here, in order, so their state changes never interleave
+        self.commands = CommandQueue(self.state_broadcasts.hold)
+        self.live_odds = LiveOdds(self.state_broadcasts.request)
+        self.database = database
+        self.stats_aggregator = StatsAggregator()
+        wal = WriteAheadLog(os.path.join(WAL_DIR, f"{database.collection.name}.wal"))
+        self.results_journal = WriteBehindJournal(database, wal, on_flush=self.broadcast_refresh_stats)
+
+    async def join(self, websocket):
+        """Queue a new client for the next admission batch, which sends it the current game_state
+        without re-sending anything to the clients already watching."""
+        self.admitting.append(websocket)
+        if self.admission is None:
+            self.admission = asyncio.get_running_loop().call_later(
+                ADMISSION_WINDOW, lambda: asyncio.ensure_future(self.admit()))
+
+    async def admit(self):
+        if self.admission is not None:
+            self.admission.cancel()
+            self.admission = None
+        newcomers, self.admitting = self.admitting, []
+        if not newcomers:
+            return
+        snapshot = await self.current_snapshot()
+        payload = json.dumps({**snapshot, "seq": self.seq})
+        # Members from here on, so nothing broadcast while the snapshot is on its way is missed
+        self.clients.update(newcomers)
+        self.admission_metrics["batches"] += 1
+        self.admission_metrics["admitted"] += len(newcomers)
+        self.admission_metrics["last_batch"] = len(newcomers)
+        dropped = await broadcast(snapshot, newcomers, payload)
+        self.clients.difference_update(dropped)
+
+    def leave(self, websocket):
+        self.clients.discard(websocket)
+        if websocket in self.admitting:
+            self.admitting.remove(websocket)
+
+    def next_seq(self):
+        self.seq += 1
+        return self.seq
+
+    async def broadcast(self, message, clients=None, audience="all", seq=None):
+        """Push message to every client of this table (or just `clients`), dropping dead ones.
+
+        Frames meant for an audience ("all", "full" or "delta" protocol clients) get the next
+        seq (or `seq`, which the full and delta variants of one game_state share), are kept in
+        recent_frames for resume and are published on the worker bus for the clients other
+        workers hold. Frames for one client (audience None) carry the latest seq."""
+        if audience:
+            if seq is None:
+                seq = self.next_seq()
+            payload = json.dumps({**message, "seq": seq})
+            self.recent_frames.append((seq, audience, payload))
+            if worker_bus is not None:
+                worker_bus.publish_frame(self.table_id, audience, payload)
+        else:
+            payload = json.dumps({**message, "seq": self.seq})
+        dropped = await broadcast(message, self.clients if clients is None else clients, payload)
+        self.clients.difference_update(dropped)
+
+    async def setup_database(self):
+        """Startup work that needs MongoDB: indexes, the hot query check and the stats, seeded from
+        the collection plus the journal entries it has not applied. Raises if MongoDB is down."""
+        await self.database.ping()
+        await ensure_indexes(self.database)
+        await check_query_plans(self.database)
+        await self.stats_aggregator.load(self.database, self.results_journal.unstored)
+        await self.broadcast_refresh_stats()
+
+    async def broadcast_refresh_stats(self):
+        """Push the current stats to every client, instead of asking each one to call get_stats."""
+        await self.broadcast({"action": "stats", **self.stats_aggregator.snapshot()})
+
+    async def broadcast_result(self, result_data):
+        result_data["canUndoLastWin"] = self.stats_aggregator.has_history()
+        await self.broadcast(result_data)
+
+    def build_game_state(self):
+        message = {"action": "game_state", **self.table.snapshot()}
+        # Undo last win needs at least one saved game; the row count is tracked locally by stats_aggregator
+        message["canUndoLastWin"] = self.stats_aggregator.has_history()
+        message["odds"] = self.live_odds.current(self.table.shoe)  # Exact odds of the next hand from the cards left in the shoe
+        message["autoDealPaused"] = self.auto_dealer.paused
+        return message
+
+    async def broadcast_game_state(self):
+        """Mark game_state as changed. The actual frame is sent once per action by state_broadcasts."""
+        self.state_broadcasts.request()
+
+    async def flush_game_state(self):
+        # Built even without clients here: the version, snapshot and replay buffer stay current
+        message = self.build_game_state()
+        if self.last_state_snapshot is None:
+            changes = {key: value for key, value in message.items() if key != "action"}
+        else:
+            changes = {key: value for key, value in message.items() if self.last_state_snapshot.get(key) != value}
+        if changes:
+            self.state_version += 1
+            self.last_state_snapshot = message
+
+        delta_clients = [websocket for websocket in self.clients if client_protocols.get(websocket) == "delta"]
+        full_clients = [websocket for websocket in self.clients if client_protocols.get(websocket) != "delta"]
+        seq = self.next_seq()
+        await self.broadcast({**message, "version": self.state_version}, full_clients, audience="full", seq=seq)
+        if changes:
+            # Built even without delta clients here, for resume and for other workers' clients
+            await self.broadcast({
+                "action": "game_state_delta",
+                "version": self.state_version,
+                "base_version": self.state_version - 1,
+                "changes": changes
+            }, delta_clients, audience="delta", seq=seq)
+
+    async def current_snapshot(self):
+        """The current game_state with its version. Changes not broadcast yet are flushed to
+        every client first, so the snapshot never gets ahead of the version numbers."""
+        if self.last_state_snapshot is None or self.build_game_state() != self.last_state_snapshot:
+            self.state_broadcasts.request()
+            await self.state_broadcasts.flush()
+        return {**self.last_state_snapshot, "version": self.state_version}
+
+    async def send_game_state_snapshot(self, websocket):
+        """Send the full, versioned game_state to one client (on subscribe or after it reports a gap)."""
+        await self.broadcast(await self.current_snapshot(), [websocket], audience=None)
+
+    async def resume(self, websocket, last_seq):
+        """Replay the frames a reconnecting client missed after `last_seq`, in order. If they are
+        no longer all buffered (or last_seq is not from this server run), send a snapshot and the
+        stats instead. Returns True if the frames could be replayed. A client whose first message
+        was this resume skipped the admission snapshot and becomes a member here."""
+        self.clients.add(websocket)
+        audience = "delta" if client_protocols.get(websocket) == "delta" else "full"
+        oldest = self.recent_frames[0][0] if self.recent_frames else self.seq + 1
+        if not isinstance(last_seq, int) or last_seq < oldest or last_seq > self.seq:
+            await self.broadcast({"action": "resume", "snapshot": True, "replayed": 0}, [websocket], audience=None)
+            await self.send_game_state_snapshot(websocket)
+            await self.broadcast({"action": "stats", **self.stats_aggregator.snapshot()}, [websocket], audience=None)
+            return False
+        missed = [payload for seq, frame_audience, payload in self.recent_frames
+                  if seq > last_seq and frame_audience in ("all", audience)]
+        await self.broadcast({"action": "resume", "snapshot": False, "replayed": len(missed)}, [websocket], audience=None)
+        for payload in missed:
+            if not await send_frame(websocket, payload):
+                self.clients.discard(websocket)
+                break
+        return True
 
-async def handle_end_burn_card(websocket):
-    """Handle end burn card button"""
-    if game_state["burn_mode"] != "active":
-        game_state["burn_available"] = False  # Always disable End Burn button on click
-        await send_error(websocket, "Burn mode not active")
+async def reset_all(host):
+    host.table.reset()
+    # The wipe is applied in order with any queued results by the write-behind journal
+    host.results_journal.clear()
+    host.stats_aggregator.clear()
+    await host.broadcast_refresh_stats()
+
+async def handle_set_protocol(host, websocket, protocol):
+    if protocol == "delta":
+        client_protocols[websocket] = "delta"
+    elif protocol == "full":
+        client_protocols.pop(websocket, None)
+    else:
+        await send_error(websocket, f"Unknown protocol: {protocol}")
         return False
-    game_state["burn_mode"] = "completed"
-    game_state["burn_available"] = False  # Immediately disable End Burn button
-    await send_success(websocket, "Burn mode ended.")
-    logging.info("Burn mode ended.")
+    await host.send_game_state_snapshot(websocket)
     return True
 
-def get_calculation_cards(card_type):
-    """Returns the appropriate card list for calculations based on game mode"""
-    if game_state["game_mode"] == "vip":
-        if card_type == "player":
-            return dummy_player_cards
-        else:  # banker
-            return dummy_banker_cards
-    else:
-        if card_type == "player":
-            return player_cards
-        else:  # banker
-            return banker_cards
-
-async def broadcast_game_state():
-    if not connected_clients:
-        return
-    
-    # Check if there are any entries in MongoDB for undo last win
-    has_mongo_entries = await collection.count_documents({}) > 0
-    game_state["cards_revealed"]= not has_unrevealed_cards() if game_state["game_mode"] == "vip" else True
-    next_recipient = get_next_card_recipient()
-    mode = game_state.get("game_mode", "manual")
-    if mode == "automatic":
-        can_shuffle = len(remaining_cards) < 52
-    else:
-        can_shuffle = False
-    
-    # Use appropriate cards for totals
-    calc_player_cards = get_calculation_cards("player")
-    calc_banker_cards = get_calculation_cards("banker")
-    
-    message = {
-        "action": "game_state",
-        "playerCards": player_cards,  # Display cards (may contain "BR")
-        "bankerCards": banker_cards,  # Display cards (may contain "BR")
-        "playerTotal": calculate_hand_score(calc_player_cards),  # Use calculation cards
-        "bankerTotal": calculate_hand_score(calc_banker_cards),  # Use calculation cards
-        "nextCardGoesTo": next_recipient,
-        "gamePhase": game_state["game_phase"],
-        "playerPair": game_pairs["player_pair"],
-        "bankerPair": game_pairs["banker_pair"],
-        "remainingCards": len(remaining_cards),
-        "usedCards": sum(card_duplicates.values()),
-        "canUndo": len(player_cards) > 0 or len(banker_cards) > 0 or (last_game_result and game_state["game_phase"] == "finished"),
-        "canUndoLastWin": has_mongo_entries,
-        "canCalculate": game_state["can_calculate"],
-        "canShuffle": can_shuffle,
-        "burnMode": game_state["burn_mode"],
-        "burnAvailable": game_state["burn_available"],
-        "burnCard": burn_card,
-        "naturalWin": game_state["natural_win"],
-        "naturalType": game_state["natural_type"],
-        "round": game_state["round"],
-        "activePlayers": list(game_state["active_players"]),
-        "autoDealingInProgress": game_state["auto_dealing"],
-        "noPlayersActive": next_recipient == "no_players",
-        "canManagePlayers": game_state["can_manage_players"],
-        "is_super_six": game_results["is_super_six"],
-        "table_number": game_state["table_number"],
-        "max_bet": game_state["max_bet"],
-        "min_bet": game_state["min_bet"],
-        "game_mode": game_state["game_mode"],
-        "vip_player_revealer": game_state["vip_player_revealer"],
-        "vip_banker_revealer": game_state["vip_banker_revealer"],
-        "cards_revealed": game_state["cards_revealed"],
-        "winner": game_state["winner"]
-    }
-    websockets_to_remove = set()
-    for websocket in connected_clients:
-        try:
-            await websocket.send(json.dumps(message))
-        except websockets.exceptions.ConnectionClosed:
-            websockets_to_remove.add(websocket)
-    connected_clients.difference_update(websockets_to_remove)
-
-async def broadcast_result(result_data):
-    if not connected_clients:
-        return
-
-    result_data["canUndoLastWin"] = await collection.count_documents({}) > 0
-        
-    websockets_to_remove = set()
-    for websocket in connected_clients:
+# --- Client action registry ---
+REQUIRED = object()
+NUMBER = (int, float)
+
+class Field:
+    """One declared field of a client action: the JSON types it accepts, its default if the
+    field is optional, and an optional parse step (e.g. int for a bet sent as a string)."""
+
+    def __init__(self, kinds, default=REQUIRED, parse=None):
+        self.kinds = kinds if isinstance(kinds, tuple) else (kinds,)
+        self.default = default
+        self.parse = parse
+
+    def read(self, name, data):
+        if name not in data:
+            if self.default is REQUIRED:
+                raise ValueError(f"Missing {name}")
+            return self.default
+        value = data[name]
+        # JSON true/false must not pass for a number
+        if not isinstance(value, self.kinds) or (isinstance(value, bool) and bool not in self.kinds):
+            raise ValueError(f"Invalid {name}")
+        if self.parse:
+            try:
+                value = self.parse(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"Invalid {name}")
+        return value
+
+ACTIONS = {}  # action name -> (handler, {field name: Field}); handlers take (host, websocket, **fields)
+
+def client_action(*names, **fields):
+    """Register a handler for the named client actions with the fields it reads from the message.
+    Fields a message carries beyond these (such as "table") are ignored."""
+    def register(handler):
+        for name in names:
+            ACTIONS[name] = (handler, fields)
+        return handler
+    return register
+
+def parse_action(data):
+    """The handler and field values for one client message. Raises ValueError for a message that
+    cannot run, before anything is queued on the table."""
+    if not isinstance(data, dict):
+        raise ValueError("Invalid message")
+    action = data.get("action")
+    if not isinstance(action, str) or action not in ACTIONS:
+        raise ValueError(f"Unknown action: {action}")
+    handler, fields = ACTIONS[action]
+    return action, handler, {name: field.read(name, data) for name, field in fields.items()}
+
+# Timings of the action being run, so send_error() can count the error replies it sends
+current_action = contextvars.ContextVar("current_action", default=None)
+
+class ActionMetrics:
+    """Calls, error replies, exceptions and run time of each client action at one table, plus
+    the messages rejected before they reached the table."""
+
+    def __init__(self):
+        self.actions = {}  # action name -> {"calls", "errors", "failures", "timing": LatencyHistogram}
+        self.rejected = 0
+
+    async def run(self, name, handler, *args, **fields):
+        entry = self.actions.get(name)
+        if entry is None:
+            entry = self.actions[name] = {"calls": 0, "errors": 0, "failures": 0, "timing": LatencyHistogram()}
+        entry["calls"] += 1
+        token = current_action.set(entry)
+        started = time.perf_counter()
         try:
-            await websocket.send(json.dumps(result_data))
-        except websockets.exceptions.ConnectionClosed:
-            websockets_to_remove.add(websocket)
-    
-    connected_clients.difference_update(websockets_to_remove)
+            return await handler(*args, **fields)
+        except Exception:
+            entry["failures"] += 1
+            raise
+        finally:
+            current_action.reset(token)
+            entry["timing"].record((time.perf_counter() - started) * 1000)
+
+    def stats(self):
+        actions = {}
+        for name, entry in self.actions.items():
+            timing = entry["timing"].stats()
+            actions[name] = {
+                "calls": entry["calls"],
+                "errors": entry["errors"],
+                "failures": entry["failures"],
+                "error_rate": round((entry["errors"] + entry["failures"]) / entry["calls"], 4),
+                "p50_ms": timing["p50_ms"],
+                "p99_ms": timing["p99_ms"],
+                "max_ms": timing["max_ms"],
+            }
+        return {"rejected": self.rejected, "actions": actions}
 
 async def send_error(websocket, message):
-    await websocket.send(json.dumps({"action": "error", "message": message}))
+    entry = current_action.get()
+    if entry is not None:
+        entry["errors"] += 1
+    if websocket is None:  # a card from the shoe reader has nobody to answer
+        logging.warning(message)
+        return
+    await send_frame(websocket, json.dumps({"action": "error", "message": message}))
 
 async def send_success(websocket, message):
-    await websocket.send(json.dumps({"action": "success", "message": message}))
+    if websocket is None:
+        logging.info(message)
+        return
+    await send_frame(websocket, json.dumps({"action": "success", "message": message}))
 
 
-async def handle_add_card(websocket, card, is_auto_deal=False):
-    if not is_auto_deal:
-        if game_state["auto_dealing"]:
-            await send_error(websocket, "Cannot add cards manually during auto-dealing")
-            return False
-        
-        # MULTI-BURN: If in burn mode, burn every card added until burn mode ends
-        if game_state["burn_mode"] == "active":
-            if not card or not is_valid_card(card) or not can_add_card(card):
-                await send_error(websocket, f"Invalid burn card: {card}")
-                return False
-            global burned_cards
-            if card in remaining_cards:
-                remaining_cards.remove(card)
-            card_duplicates[card] += 1
-            burned_cards.append(card)
-            burn_card = card
-            # Do NOT set burn_mode to completed here; only when End Burn is clicked
-            # burn_available remains False
+async def handle_add_card(host, websocket, card):
+    """A card from the dealer's keypad or the shoe reader; burned instead while burn mode is on."""
+    try:
+        if host.table.burning:
+            host.table.burn(card)
             await send_success(websocket, f"Card burned: {card}")
-            logging.info(f"Card burned: {card}")
             return True
-        
-        if not card or not is_valid_card(card) or not can_add_card(card):
-            await send_error(websocket, f"Invalid card: {card}")
-            return False
-    
-    recipient = get_next_card_recipient()
-    
-    if not is_auto_deal and recipient == "no_players":
-        await send_error(websocket, "No active players - cannot deal cards")
-        return False
-    
-    if recipient == "waiting_for_reveal":
-        if not is_auto_deal:
-            await send_error(websocket, "Cannot add more cards until current cards are revealed")
-        return False
-    
-    if recipient == "complete":
-        if not is_auto_deal:
-            await send_error(websocket, "Cannot add more cards")
+        result = host.table.add_card(card)
+    except GameError as e:
+        await send_error(websocket, str(e))
         return False
-    
-    # VIP Mode Logic: Add to dummy lists and original lists with "BR"
-    if game_state["game_mode"] == "vip":
-        if recipient == "player":
-            dummy_player_cards.append(card)  # Add actual card to dummy list
-            player_cards.append("BR")        # Add "BR" to original list
-            # Once the first card is dealt to player, disable burn buttons
-            if len(player_cards) == 1:
-                game_state["burn_available"] = False
-                game_state["burn_mode"] = "completed"
-        else:
-            dummy_banker_cards.append(card)  # Add actual card to dummy list
-            banker_cards.append("BR")        # Add "BR" to original list
-    else:
-        # Normal Mode Logic
-        if recipient == "player":
-            player_cards.append(card)
-            # Once the first card is dealt to player, disable burn buttons
-            if len(player_cards) == 1:
-                game_state["burn_available"] = False
-                game_state["burn_mode"] = "completed"
-        else:
-            banker_cards.append(card)
-    
-    if len(player_cards) + len(banker_cards) == 1:
-        game_state["can_manage_players"] = False
-        logging.info("Player management disabled - cards being dealt")
-    
-    if is_auto_deal:
-        card_duplicates[card] += 1
-        last_card_info.update({"card": card, "recipient": recipient})
-    else:
-        update_card_tracking(card, recipient)
-    
-    # Pair detection logic - use dummy cards for VIP mode
-    if game_state["game_mode"] == "vip":
-        if recipient == "player" and len(dummy_player_cards) == 2:
-            game_pairs["player_pair"] = has_pair(dummy_player_cards)
-            logging.info(f"Player pair detected (VIP): {dummy_player_cards} -> {game_pairs['player_pair']}")
-        elif recipient == "banker" and len(dummy_banker_cards) == 2:
-            game_pairs["banker_pair"] = has_pair(dummy_banker_cards)
-            logging.info(f"Banker pair detected (VIP): {dummy_banker_cards} -> {game_pairs['banker_pair']}")
-    else:
-        if recipient == "player" and len(player_cards) == 2:
-            game_pairs["player_pair"] = has_pair(player_cards)
-            logging.info(f"Player pair detected: {player_cards} -> {game_pairs['player_pair']}")
-        elif recipient == "banker" and len(banker_cards) == 2:
-            game_pairs["banker_pair"] = has_pair(banker_cards)
-            logging.info(f"Banker pair detected: {banker_cards} -> {game_pairs['banker_pair']}")
-    
-    total_cards = len(player_cards) + len(banker_cards)
-
-    # VIP logic to pause after 4 cards for reveal
-    if total_cards == 4 and game_state["game_mode"] == "vip" and has_unrevealed_cards():
-        game_state["game_phase"] = "waiting_for_reveal"
-        game_state["can_calculate"] = False # Cannot calculate until reveal
-        await broadcast_game_state()
-        return True # Stop dealing process
-
-    if total_cards >= 5 and game_state["game_mode"] == "vip" and has_unrevealed_cards():
-        game_state["game_phase"] = "waiting_for_reveal"
-        game_state["can_calculate"] = False
-        await broadcast_game_state()
-        return True
-    
-    # Handle 4 cards logic
-    if total_cards == 4 and game_state["game_mode"] != "vip":
-        # Use dummy cards for VIP mode calculations
-        
-        player_score = calculate_hand_score(player_cards)
-        banker_score = calculate_hand_score(banker_cards)
-        
-        game_state["can_calculate"] = True
-        
-        if player_score >= 8 or banker_score >= 8:
-            game_state["natural_win"] = True
-            game_state["natural_type"] = "natural_9" if (player_score == 9 or banker_score == 9) else "natural_8"
-            if not is_auto_deal:
-                await calculate_result()
-                return True
-
-    if not is_auto_deal and get_next_card_recipient() == "complete":
-        await calculate_result()
-    
+    if result:
+        await announce_result(host, result)
+    await host.broadcast_game_state()
     return True
 
 
-async def calculate_result():
-    global last_game_result
-    
-    # Use appropriate cards based on game mode
-    calc_player_cards = get_calculation_cards("player")
-    calc_banker_cards = get_calculation_cards("banker")
-    
-    player_score = calculate_hand_score(calc_player_cards)
-    banker_score = calculate_hand_score(calc_banker_cards)
-    
-    if game_state["game_mode"] == "vip" and (len(calc_player_cards)+len(calc_banker_cards) == 4):
-        if player_score >= 8 or banker_score >= 8:
-            game_state["natural_win"] = True
-            game_state["natural_type"] = "natural_9" if (player_score == 9 or banker_score == 9) else "natural_8"
-
-    # is_super_six = (banker_score == 6 and banker_score > player_score and len(calc_banker_cards) == 3)
-    is_super_six = (banker_score == 6 and banker_score > player_score)
-    
-    # Use calculation cards for pair detection too
-    player_pair = len(calc_player_cards) == 2 and has_pair(calc_player_cards)
-    banker_pair = len(calc_banker_cards) == 2 and has_pair(calc_banker_cards)
-    
-    game_results["is_super_six"] = is_super_six
-    is_natural = game_state["natural_win"]
-    natural_type = game_state["natural_type"]
-    
-    # UPDATED: Separate natural detection using calculation cards
-    player_natural = is_natural and player_score >= 8 and player_score > banker_score
-    banker_natural = is_natural and banker_score >= 8 and banker_score > player_score
-    
-    previous_state = {
-        "round": game_state["round"]
-    }
-    
-    if player_score > banker_score:
-        winner = "player"
-    elif banker_score > player_score:
-        winner = "banker"
-    else:
-        winner = "tie"
-    
-    game_state["round"] += 1
+async def announce_result(host, result):
+    """Persist a finished hand and push it to every client."""
     await save_game_result(
-        winner, game_state["round"],
-        is_super_six, player_pair, banker_pair, 
-        player_natural, banker_natural
+        host, result["winner"], result["round"],
+        result["is_super_six"], result["player_pair"], result["banker_pair"],
+        result["player_natural"], result["banker_natural"]
     )
-    game_state["winner"] = winner
-    
-    last_game_result = {
-        "winner": winner,
-        "is_super_six": is_super_six,
-        "player_natural": player_natural,
-        "banker_natural": banker_natural,
-        "previous_state": previous_state
-    }
-    game_state["game_phase"] = "finished"
-    game_state["can_calculate"] = False
-    
-    result_data = {
+    await host.broadcast_result({
         "action": "game_result",
-        "winner": winner,
-        "playerCards": player_cards,  # Still send display cards
-        "bankerCards": banker_cards,  # Still send display cards
-        "playerTotal": player_score,
-        "bankerTotal": banker_score,
-        "playerPair": player_pair,
-        "bankerPair": banker_pair,
-        "is_super_six": is_super_six,
-        "isNatural": is_natural,
-        "naturalType": natural_type,
-        "playerNatural": player_natural,
-        "bankerNatural": banker_natural,
-        "round": game_state["round"]
-    }
-    await broadcast_result(result_data)
-    await broadcast_game_state()
-    await broadcast_refresh_stats()
-
-
-async def handle_burn_card(websocket, card):
-    global burn_card
-    
-    if game_state["auto_dealing"]:
-        await send_error(websocket, "Cannot burn cards manually during auto-dealing")
-        return False
-    
-    if not game_state["burn_enabled"]:
-        await send_error(websocket, "Burn card not available")
-        return False
-    
-    if not card or not is_valid_card(card) or not can_add_card(card):
-        await send_error(websocket, f"Invalid burn card: {card}")
-        return False
-    
-    if card in remaining_cards:
-        remaining_cards.remove(card)
-    card_duplicates[card] += 1
-    burn_card = card
-    game_state["burn_enabled"] = False
-    
-    await send_success(websocket, f"Burned card: {card}")
-    return True
+        "winner": result["winner"],
+        "playerCards": host.table.player_cards,  # Still send display cards
+        "bankerCards": host.table.banker_cards,  # Still send display cards
+        "playerTotal": result["player_total"],
+        "bankerTotal": result["banker_total"],
+        "playerPair": result["player_pair"],
+        "bankerPair": result["banker_pair"],
+        "is_super_six": result["is_super_six"],
+        "isNatural": result["is_natural"],
+        "naturalType": result["natural_type"],
+        "playerNatural": result["player_natural"],
+        "bankerNatural": result["banker_natural"],
+        "round": result["round"]
+    })
+    await host.broadcast_game_state()
+    await host.broadcast_refresh_stats()
 
-async def handle_undo_card(websocket):
-    global last_game_result
-    # 1. Block undo after auto-deal (auto_dealing just finished)
-    if last_game_result and last_game_result.get("auto_deal", False):
-        await send_error(websocket, "Undo is not allowed after auto-deal. Please reset or start a new game.")
-        return False
-    if game_state["auto_dealing"]:
-        await send_error(websocket, "Cannot undo during auto-dealing")
+
+async def handle_undo_card(host, websocket):
+    try:
+        host.table.check_undo()
+    except GameError as e:
+        await send_error(websocket, str(e))
         return False
-    # 2. Undo after game finished: update stats and remove last card
-    if last_game_result and game_state["game_phase"] == "finished":
+    # Undo after game finished: remove the stored result and the last card
+    if host.table.finished:
         try:
-            last_entry = await collection.find_one(sort=[("timestamp", -1)])
-            if last_entry and last_entry.get("round") == game_state["round"]:
-                await collection.delete_one({"_id": last_entry["_id"]})
-                previous_state = last_game_result["previous_state"]
-                game_state.update(previous_state)
-                game_state["game_phase"] = "waiting"
-                game_state["can_calculate"] = True
-                game_state["natural_win"] = False
-                game_state["natural_type"] = None
-                # Remove last card dealt (from player or banker)
-                total_cards = len(player_cards) + len(banker_cards)
-                if total_cards > 0:
-                    if len(banker_cards) > 0 and (total_cards % 2 == 0):
-                        last_card_to_undo = banker_cards.pop()
-                        if game_state["game_mode"] == "vip":
-                            dummy_banker_cards.pop()
-                        update_card_tracking(last_card_to_undo, "banker", is_undo=True)
-                    elif len(player_cards) > 0:
-                        last_card_to_undo = player_cards.pop()
-                        if game_state["game_mode"] == "vip":
-                            dummy_player_cards.pop()
-                        update_card_tracking(last_card_to_undo, "player", is_undo=True)
-                last_game_result = None
+            last_entry = await host.results_journal.latest()
+            if last_entry and last_entry.get("round") == host.table.state["round"]:
+                host.results_journal.delete(last_entry)
+                host.stats_aggregator.remove(last_entry)
+                host.table.undo_result()
                 await send_success(websocket, f"Undid game result for Round {last_entry.get('round')}, removed last card.")
                 logging.info(f"Undid game result for Round {last_entry.get('round')}, removed last card.")
-                await asyncio.sleep(0.2)
-                await broadcast_refresh_stats()
-                await broadcast_game_state()
+                await host.broadcast_refresh_stats()
+                await host.broadcast_game_state()
                 return True
         except Exception as e:
             logging.error(f"Error undoing game result: {e}")
             await send_error(websocket, "Error undoing game result")
             return False
-    last_card_to_undo = None
-    last_recipient = None
-    if len(player_cards) > 0 and len(banker_cards) > 0:
-        total_cards = len(player_cards) + len(banker_cards)
-        if total_cards == 2:
-            last_card_to_undo = banker_cards[-1]
-            last_recipient = "banker"
-        elif total_cards == 3:
-            last_card_to_undo = player_cards[-1]
-            last_recipient = "player"
-        elif total_cards == 4:
-            last_card_to_undo = banker_cards[-1]
-            last_recipient = "banker"
-        elif total_cards == 5:
-            last_card_to_undo = player_cards[-1]
-            last_recipient = "player"
-        elif total_cards == 6:
-            last_card_to_undo = banker_cards[-1]
-            last_recipient = "banker"
-    elif len(player_cards) > 0:
-        last_card_to_undo = player_cards[-1]
-        last_recipient = "player"
-    elif len(banker_cards) > 0:
-        last_card_to_undo = banker_cards[-1]
-        last_recipient = "banker"
-    else:
-        await send_error(websocket, "No cards to undo")
+    try:
+        card, recipient = host.table.undo()
+    except GameError as e:
+        await send_error(websocket, str(e))
         return False
-    if last_recipient == "player":
-        player_cards.pop()
-    else:
-        banker_cards.pop()
-    update_card_tracking(last_card_to_undo, last_recipient, is_undo=True)
-    game_pairs["player_pair"] = len(player_cards) == 2 and has_pair(player_cards)
-    game_pairs["banker_pair"] = len(banker_cards) == 2 and has_pair(banker_cards)
-    total_cards = len(player_cards) + len(banker_cards)
-    if total_cards < 4:
-        game_state.update({
-            "natural_win": False,
-            "natural_type": None,
-            "can_calculate": False,
-            "game_phase": "waiting"
-        })
-    elif total_cards == 4:
-        player_score = calculate_hand_score(player_cards)
-        banker_score = calculate_hand_score(banker_cards)
-        if player_score >= 8 or banker_score >= 8:
-            game_state["natural_win"] = True
-            game_state["natural_type"] = "natural_9" if (player_score == 9 or banker_score == 9) else "natural_8"
-        else:
-            game_state["natural_win"] = False
-            game_state["natural_type"] = None
-        game_state["can_calculate"] = True
-        game_state["game_phase"] = "waiting"
-    if total_cards == 0:
-        game_state["can_manage_players"] = True
-    await send_success(websocket, f"Undid card: {last_card_to_undo} from {last_recipient}")
-    logging.info(f"Undid card: {last_card_to_undo} from {last_recipient}")
-    await asyncio.sleep(0.2)
-    await broadcast_refresh_stats()
-    await broadcast_game_state()
+    await send_success(websocket, f"Undid card: {card} from {recipient}")
+    await host.broadcast_refresh_stats()
+    await host.broadcast_game_state()
     return True
 
-async def handle_shuffle_cards(websocket):
-    if game_state["auto_dealing"]:
-        await send_error(websocket, "Cannot shuffle manually during auto-dealing")
-        return False
-    
-    mode = game_state.get("game_mode", "manual")
-    
-    # Check card count only for automatic mode
-    if mode == "automatic" and len(remaining_cards) >= 52:
-        await send_error(websocket, "Too many cards remaining to shuffle")
+async def handle_shuffle_cards(host, websocket):
+    try:
+        host.table.shuffle()
+    except GameError as e:
+        await send_error(websocket, str(e))
         return False
-    
-    # Shuffle deck and send response (same for all modes)
-    await shuffle_deck(mode)
     await send_success(websocket, "Cards shuffled! Deck reset to 416 cards. Burn card enabled.")
-    await broadcast_game_state()
+    await host.broadcast_game_state()
     return True
 
-async def handle_auto_deal(websocket):
-    try:
-        if game_state["auto_dealing"]:
-            await send_error(websocket, "Auto-dealing already in progress")
-            return False
-        # 3. Only allow auto-deal if there is at least one active player
-        if len(game_state["active_players"]) == 0:
-            await send_error(websocket, "Cannot auto-deal: No active players.")
-            return False
-        if len(player_cards) > 0 or len(banker_cards) > 0:
-            await send_error(websocket, "Please start a new game before auto-dealing")
+class AutoDealer:
+    """Auto-deal of one table, run as a background task so the dealer's connection stays free.
+
+    Each step (the reshuffle at the cut card, one dealt card, settling the hand) is a command
+    on the table's queue, so it is serialized with every dealer action, and goes out as its own
+    game_state frame. Between steps the task waits `card_delay` seconds (`shuffle_delay` after
+    the reshuffle); a delay of 0 is turbo mode. Pausing holds the task before its next step."""
+
+    def __init__(self, host):
+        self.host = host
+        self.card_delay = AUTO_DEAL_CARD_DELAY
+        self.shuffle_delay = AUTO_DEAL_SHUFFLE_DELAY
+        self.task = None
+        self.dealt = 0
+        self.running = asyncio.Event()  # cleared while paused
+        self.running.set()
+
+    @property
+    def paused(self):
+        return self.task is not None and not self.running.is_set()
+
+    def start(self, websocket):
+        """Called from a queued command once Table.start_auto_deal() has succeeded."""
+        self.running.set()
+        self.dealt = 0
+        self.task = asyncio.create_task(self.run(websocket))
+
+    def pause(self):
+        if self.task is None:
+            raise GameError("No auto-deal in progress")
+        self.running.clear()
+
+    def resume(self):
+        if self.task is None:
+            raise GameError("No auto-deal in progress")
+        self.running.set()
+
+    def cancel(self):
+        """Stop dealing and leave the cards dealt so far on the table. Runs as a queued command,
+        so the task is never cancelled half-way through a step; a step it queued is skipped."""
+        if self.task is None:
+            raise GameError("No auto-deal in progress")
+        task, self.task = self.task, None
+        task.cancel()
+        self.running.set()
+        self.host.table.abort_auto_deal()
+
+    def set_cadence(self, card_delay=None, shuffle_delay=None):
+        for delay in (card_delay, shuffle_delay):
+            if delay is not None and not (isinstance(delay, (int, float)) and 0 <= delay <= AUTO_DEAL_MAX_DELAY):
+                raise GameError(f"Auto-deal delay must be between 0 and {AUTO_DEAL_MAX_DELAY} seconds")
+        if card_delay is not None:
+            self.card_delay = card_delay
+        if shuffle_delay is not None:
+            self.shuffle_delay = shuffle_delay
+
+    async def wait(self, delay):
+        await asyncio.sleep(delay)  # also yields to pending dealer actions in turbo mode
+        await self.running.wait()
+
+    async def run(self, websocket):
+        host, table = self.host, self.host.table
+        try:
+            if len(table.shoe) < CUT_CARD:
+                await host.commands.submit("auto_deal_shuffle", self.shuffle)
+                await self.wait(self.shuffle_delay)
+            while await host.commands.submit("auto_deal_card", lambda: self.deal_card(websocket)):
+                await self.wait(self.card_delay)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await host.commands.submit("auto_deal_abort", self.abort)
+            await self.notify(websocket, "error", f"Auto-deal failed: {str(e)}")
+        finally:
+            if self.task is asyncio.current_task():
+                self.task = None
+
+    async def shuffle(self):
+        self.host.table.reshuffle()
+        await self.host.broadcast_game_state()
+
+    async def deal_card(self, websocket):
+        """Deal the next card, or settle the hand if it needs no more. Returns True while dealing."""
+        host, table = self.host, self.host.table
+        dealt = table.deal()
+        if not dealt:
+            result = table.finish_auto_deal()
+            self.task = None
+            if result:
+                await announce_result(host, result)
+            await host.broadcast_game_state()
+            await self.notify(websocket, "success", "Auto-deal completed!")
             return False
-        game_state["auto_dealing"] = True
-        game_state["game_phase"] = "auto_dealing"
-        game_state["can_manage_players"] = False  # 5. Block player management after auto-deal
-        await send_success(websocket, "Starting auto-deal...")
-        await broadcast_game_state()
-        if len(remaining_cards) < 52:
-            await shuffle_deck()
-            await broadcast_game_state()
-            await asyncio.sleep(2.5)
-        card_count = 0
-        while True:
-            recipient = get_next_card_recipient()
-            if recipient in ["complete", "no_players"]:
-                break
-            if len(remaining_cards) == 0:
-                raise Exception("No cards available to deal")
-            card = remaining_cards.popleft()
-            success = await handle_add_card(websocket, card, is_auto_deal=True)
-            if not success:
-                break
-            card_count += 1
-            logging.info(f"Auto-deal progress: {card_count} cards dealt ({card} to {recipient})")
-            await broadcast_game_state()
-            await asyncio.sleep(2.5)
-        if get_next_card_recipient() == "complete":
-            await calculate_result()
-            await broadcast_game_state()
-        game_state["auto_dealing"] = False
-        game_state["game_phase"] = "finished"
-        # Mark last_game_result as auto_deal for undo restriction
-        if last_game_result:
-            last_game_result["auto_deal"] = True
-        await send_success(websocket, "Auto-deal completed!")
-        await broadcast_game_state()
+        self.dealt += 1
+        logging.info(f"Auto-deal progress: {self.dealt} cards dealt ({dealt[0]} to {dealt[1]})")
+        await host.broadcast_game_state()
         return True
-    except Exception as e:
-        game_state["auto_dealing"] = False
-        game_state["game_phase"] = "waiting"
-        await send_error(websocket, f"Auto-deal failed: {str(e)}")
-        await broadcast_game_state()
+
+    async def abort(self):
+        self.host.table.abort_auto_deal()
+        await self.host.broadcast_game_state()
+
+    async def notify(self, websocket, action, message):
+        """Tell the dealer who started the auto-deal how it ended, if they are still connected."""
+        await send_frame(websocket, json.dumps({"action": action, "message": message}))
+
+async def handle_auto_deal(host, websocket):
+    try:
+        host.table.start_auto_deal()
+    except GameError as e:
+        await send_error(websocket, str(e))
         return False
+    host.auto_dealer.start(websocket)
+    await send_success(websocket, "Starting auto-deal...")
+    await host.broadcast_game_state()
+    return True
+
+async def handle_auto_deal_speed(host, websocket, card_delay, shuffle_delay):
+    try:
+        host.auto_dealer.set_cadence(card_delay, shuffle_delay)
+    except GameError as e:
+        await send_error(websocket, str(e))
+        return False
+    dealer = host.auto_dealer
+    mode = " (turbo)" if dealer.card_delay == 0 else ""
+    await send_success(websocket, f"Auto-deal cadence set to {dealer.card_delay}s per card{mode}, {dealer.shuffle_delay}s after a shuffle")
+    return True
 
-async def handle_manual_result(websocket, data):
+async def handle_manual_result(host, websocket, winner, is_super_six, player_pair, banker_pair, player_natural, banker_natural):
     """Handle manual game result entry"""
-    # Reinitialize round for manual mode (since no explicit new_round)
-    new_round()
-    await broadcast_game_state()
     try:
-        winner = data.get("winner")
-        is_super_six = data.get("is_super_six", False)
-        player_pair = data.get("player_pair", False)
-        banker_pair = data.get("banker_pair", False)
-        player_natural = data.get("player_natural", False)
-        banker_natural = data.get("banker_natural", False)
-        
-        if winner not in ["player", "banker", "tie"]:
-            await send_error(websocket, "Invalid winner")
-            return False
-        
-        game_state["round"] += 1
+        result = host.table.manual_result(
+            winner, is_super_six, player_pair, banker_pair, player_natural, banker_natural
+        )
+    except GameError as e:
+        await send_error(websocket, str(e))
+        await host.broadcast_game_state()
+        return False
+    try:
         await save_game_result(
-            winner, game_state["round"],
-            is_super_six, player_pair, banker_pair,
-            player_natural, banker_natural
+            host, result["winner"], result["round"],
+            result["is_super_six"], result["player_pair"], result["banker_pair"],
+            result["player_natural"], result["banker_natural"]
         )
-        
-        game_state["game_phase"] = "finished"
-        game_state["winner"] = winner
-        await send_success(websocket, f"Manual result saved: {winner} wins (Round {game_state['round']})")
-        await broadcast_refresh_stats()
-        await broadcast_game_state()
+        await send_success(websocket, f"Manual result saved: {result['winner']} wins (Round {result['round']})")
+        await host.broadcast_refresh_stats()
+        await host.broadcast_game_state()
         return True
         
     except Exception as e:
@@ -932,345 +1554,267 @@ async def handle_manual_result(websocket, data):
         await send_error(websocket, f"Error saving manual result: {str(e)}")
         return False
 
-async def handle_set_vip_revealer(websocket, player_id, revealer_type):
-    """
-    Enhanced VIP revealer logic for casino game with 6 players + 1 dealer.
-    
-    Three scenarios:
-    1. Player selects player_revealer -> Dealer becomes banker_revealer
-    2. Player selects banker_revealer -> Dealer becomes player_revealer  
-    3. Two different players selected as revealers -> No dealer involvement
-    """
-    
-    if game_state["game_mode"] != "vip":
-        await send_error(websocket, "VIP revealer can only be set in VIP mode")
-        return False
-    
-    if player_id not in game_state["active_players"]:
-        await send_error(websocket, "Player must be active to be a revealer")
+async def handle_set_vip_revealer(host, websocket, player_id, revealer_type):
+    try:
+        message = host.table.set_vip_revealer(player_id, revealer_type)
+    except GameError as e:
+        await send_error(websocket, str(e))
         return False
-    
-    if revealer_type == "player" and player_id != game_state["vip_banker_revealer"]:
-        game_state["vip_player_revealer"] = player_id
-        if game_state["vip_banker_revealer"] is None:
-            # If no banker revealer, set dealer as banker revealer
-            game_state["vip_banker_revealer"] = "dealer"
-            message = f"Player {player_id} set as player revealer, dealer set as banker revealer"
-    
-    if revealer_type == "banker" and player_id != game_state["vip_player_revealer"]:
-        game_state["vip_banker_revealer"] = player_id
-        if game_state["vip_player_revealer"] is None:
-            # If no player revealer, set dealer as player revealer
-            game_state["vip_player_revealer"] = "dealer"
-            message = f"Player {player_id} set as banker revealer, dealer set as player revealer"
-
     await send_success(websocket, message)
-    await broadcast_game_state()
-    
-    # Log current state
-    print(f"Revealer assignment complete:")
-    print(f"  Player revealer: {game_state['vip_player_revealer']}")
-    print(f"  Banker revealer: {game_state['vip_banker_revealer']}")
-    
+    await host.broadcast_game_state()
+    print(f"Player revealer: {host.table.state['vip_player_revealer']}, Banker revealer: {host.table.state['vip_banker_revealer']}")
     return True
-    
-async def handle_dealer_final_reveal(websocket):
-    """Dealer triggers final reveal for all cards in VIP mode."""
-    global player_cards, banker_cards
-    if game_state["game_mode"] != "vip":
-        await send_error(websocket, "Final reveal only available in VIP mode")
-        return False
-    if game_state["game_phase"] != "waiting_for_reveal":
-        await send_error(websocket, "Final reveal can only be triggered during waiting_for_reveal phase")
+
+async def handle_reveal(host, websocket, reveal, *args):
+    """Run one of the Table reveal calls; settles the hand if that was the last face-down card."""
+    try:
+        result = reveal(*args)
+    except GameError as e:
+        await send_error(websocket, str(e))
         return False
-    
-    player_cards[0]=dummy_player_cards[0]
-    player_cards[1]=dummy_player_cards[1]
-    banker_cards[0]=dummy_banker_cards[0]
-    banker_cards[1]=dummy_banker_cards[1]
-    await broadcast_game_state()
+    if result:
+        await announce_result(host, result)
+    await host.broadcast_game_state()
     return True
 
-counter=0
-async def handle_client(websocket):
-    global counter,player_cards,banker_cards
+async def handle_table_action(host, websocket, action, *args, success=None):
+    """Run a Table call that either succeeds or raises GameError, and report back to the client."""
     try:
-        connected_clients.add(websocket)
-        await broadcast_game_state()
-        
-        async for message in websocket:
-            try:
-                data = json.loads(message)
-                action = data.get("action")
-                
-                if action == "add_card":
-                    success = await handle_add_card(websocket, data.get("card", "").strip().upper())
-                    if success:
-                        await broadcast_game_state()
-                        print(player_cards, banker_cards, dummy_banker_cards, dummy_player_cards,sep=", ")
-                
-                elif action == "start_new_game":
-                    if game_state["auto_dealing"]:
-                        await send_error(websocket, "Cannot start new game during auto-dealing")
-                    else:
-                        new_round()
-                        await send_success(websocket, "New game started!")
-                        await broadcast_game_state()
-                    
-                elif action == "reset_game":
-                    if game_state["auto_dealing"]:
-                        await send_error(websocket, "Cannot reset during auto-dealing")
-                    else:
-                        await reset_all()
-                        await send_success(websocket, "Game reset! 416 cards available. Burn card enabled.")
-                        await broadcast_game_state()
-                    
-                elif action == "undo":
-                    success = await handle_undo_card(websocket)
-                    if success:
-                        await broadcast_game_state()
-                        
-                elif action == "shuffle_cards":
-                    success = await handle_shuffle_cards(websocket)
-                    if success:
-                        await broadcast_game_state()
-                        
-                elif action == "delete_last_entry":
-                    await delete_last_game_entry(websocket)
-                    
-                elif action == "auto_deal":
-                    await handle_auto_deal(websocket)
-                    await broadcast_game_state()
-                    
-                elif action == "set_game_mode":
-                    mode = data.get("mode", "manual")
-                    if mode not in ["manual", "live", "automatic", "vip"]:
-                        await send_error(websocket, "Invalid game mode")
-                    else:
-                        old_mode = game_state["game_mode"]
-                        game_state["game_mode"] = mode
-                        
-                        # Enable burn ONLY on first switch to live/vip mode
-                        if (old_mode == "manual" or old_mode=="automatic" )and mode in ["live", "vip"] and counter==0:
-                            game_state["burn_available"] = True
-                            logging.info(f"Burn enabled for first switch to {mode} mode")
-                            counter=1
-                        
-                        if mode == "vip":
-                            game_state["vip_player_revealer"] = None
-                            game_state["vip_banker_revealer"] = None
-                            game_state["cards_revealed"] = False
-                        else:
-                            game_state["vip_player_revealer"] = None
-                            game_state["vip_banker_revealer"] = None
-                            game_state["cards_revealed"] = True
-                        await send_success(websocket, f"Game mode set to {mode}")
-                        await broadcast_game_state()
-
-                elif action == "manual_result":
-                    if game_state["game_mode"] != "manual":
-                        await send_error(websocket, "Manual result only allowed in manual mode")
-                    else:
-                        await handle_manual_result(websocket, data)
-
-                elif action == "set_vip_player_revealer":
-                    player_id = data.get("player_id")
-                    if not player_id:
-                        await send_error(websocket, "Missing player_id")
-                        continue
-
-                    success = await handle_set_vip_revealer(websocket, player_id, "player")
-                    if success:
-                        print(f"Player revealer: {game_state['vip_player_revealer']}, Banker revealer: {game_state['vip_banker_revealer']}")
-
-                elif action == "set_vip_banker_revealer":
-                    player_id = data.get("player_id")
-                    if not player_id:
-                        await send_error(websocket, "Missing player_id")
-                        continue
-                        
-                    success = await handle_set_vip_revealer(websocket, player_id, "banker")
-                    if success:
-                        print(f"Player revealer: {game_state['vip_player_revealer']}, Banker revealer: {game_state['vip_banker_revealer']}")
-
-
-                elif action == "update_players":
-                    if not game_state["can_manage_players"]:
-                        await send_error(websocket, "Cannot add/remove players while a round is in progress. Start a new game to manage players.")
-                    else:
-                        player_id = data.get("player_id")
-                        is_active = data.get("is_active", False)
-                        if is_active:
-                            game_state["active_players"].add(player_id)
-                            await send_success(websocket, f"Player {player_id} added")
-                        else:
-                            game_state["active_players"].discard(player_id)
-                            await send_success(websocket, f"Player {player_id} removed")
-                        await broadcast_game_state()
-                        
-                elif action == "set_table_number":
-                    table_number = data.get("table_number", "FT-")
-                    game_state["table_number"] = table_number
-                    await send_success(websocket, f"Table number set to {table_number}")
-                    await broadcast_game_state()
-                    
-                elif action == "set_max_bet":
-                    max_bet = int(data.get("max_bet", 100000))
-                    game_state["max_bet"] = max_bet
-                    await send_success(websocket, f"Max bet set to {max_bet}")
-                    await broadcast_game_state()
-                    
-                elif action == "set_min_bet":
-                    min_bet = int(data.get("min_bet", 10000))
-                    game_state["min_bet"] = min_bet
-                    await send_success(websocket, f"Min bet set to {min_bet}")
-                    await broadcast_game_state()
-                    
-                elif action == "get_stats":
-                    stats = {
-                        "banker_wins": await get_banker_wins(),
-                        "player_wins": await get_player_wins(),
-                        "ties": await get_ties(),
-                        "player_pairs": await get_player_pairs(),
-                        "banker_pairs": await get_banker_pairs(),
-                        "player_naturals": await get_player_naturals(),
-                        "banker_naturals": await get_banker_naturals(),
-                    }
-                    await websocket.send(json.dumps({"action": "stats", **stats}))
-
-                elif action == "start_burn_card":
-                    success = await handle_start_burn_card(websocket)
-                    if success:
-                        await broadcast_game_state()
-                
-                elif action == "end_burn_card":
-                    success = await handle_end_burn_card(websocket)
-                    if success:
-                        await broadcast_game_state()
-                   
-                elif action == "dealer_final_reveal":
-                    await handle_dealer_final_reveal(websocket)
-                    if not has_unrevealed_cards():
-                        next_recipient = get_next_card_recipient()
-                        if next_recipient == "complete":
-                            # Only calculate if dealing is truly complete
-                            await calculate_result()
-                        else:
-                            # Set to waiting to allow more cards
-                            game_state["game_phase"] = "waiting"
-                            game_state["can_calculate"] = True
-
-                elif action == "reveal_player_card_1":
-                    player_cards[0] = dummy_player_cards[0]
-
-                    # Check if all cards are revealed AND if we need more cards
-                    if not has_unrevealed_cards():
-                        next_recipient = get_next_card_recipient()
-                        if next_recipient == "complete":
-                            # Only calculate if dealing is truly complete
-                            await calculate_result()
-                        else:
-                            # Set to waiting to allow more cards
-                            game_state["game_phase"] = "waiting"
-                            game_state["can_calculate"] = True
-
-                    await broadcast_game_state()
-
-                elif action == "reveal_player_card_2":
-                    player_cards[1] = dummy_player_cards[1]
-
-                    if not has_unrevealed_cards():
-                        next_recipient = get_next_card_recipient()
-                        if next_recipient == "complete":
-                            await calculate_result()
-                        else:
-                            game_state["game_phase"] = "waiting"
-                            game_state["can_calculate"] = True
-
-                    await broadcast_game_state()
-
-                elif action == "reveal_player_card_3":
-                    player_cards[2] = dummy_player_cards[2]
-
-                    if not has_unrevealed_cards():
-                        next_recipient = get_next_card_recipient()
-                        if next_recipient == "complete":
-                            await calculate_result()
-                        else:
-                            game_state["game_phase"] = "waiting"
-                            game_state["can_calculate"] = True
-
-                    await broadcast_game_state()
-
-                elif action == "reveal_banker_card_1":
-                    banker_cards[0] = dummy_banker_cards[0]
-
-                    if not has_unrevealed_cards():
-                        next_recipient = get_next_card_recipient()
-                        if next_recipient == "complete":
-                            await calculate_result()
-                        else:
-                            game_state["game_phase"] = "waiting"
-                            game_state["can_calculate"] = True
-
-                    await broadcast_game_state()
-
-                elif action == "reveal_banker_card_2":
-                    banker_cards[1] = dummy_banker_cards[1]
-
-                    if not has_unrevealed_cards():
-                        next_recipient = get_next_card_recipient()
-                        if next_recipient == "complete":
-                            await calculate_result()
-                        else:
-                            game_state["game_phase"] = "waiting"
-                            game_state["can_calculate"] = True
-    
-                    await broadcast_game_state()
-
-                elif action == "reveal_banker_card_3":
-                    banker_cards[2] = dummy_banker_cards[2]
+        action(*args)
+    except GameError as e:
+        await send_error(websocket, str(e))
+        return False
+    if success:
+        await send_success(websocket, success)
+    await host.broadcast_game_state()
+    return True
 
-                    if not has_unrevealed_cards():
-                        next_recipient = get_next_card_recipient()
-                        if next_recipient == "complete":
-                            await calculate_result()
-                        else:
-                            game_state["game_phase"] = "waiting"
-                            game_state["can_calculate"] = True
+# Reveal actions sent by the VIP pages: side and 0-based card positions
+REVEAL_ACTIONS = {
+    "reveal_player_card_1": (PLAYER, 0),
+    "reveal_player_card_2": (PLAYER, 1),
+    "reveal_player_card_3": (PLAYER, 2),
+    "reveal_banker_card_1": (BANKER, 0),
+    "reveal_banker_card_2": (BANKER, 1),
+    "reveal_banker_card_3": (BANKER, 2),
+    "reveal_dealer_player_cards": (PLAYER, 0, 1),
+    "reveal_dealer_banker_cards": (BANKER, 0, 1),
+}
 
-                    await broadcast_game_state()
+def requested_table(websocket):
+    """Table id from the URL path the client connected with; "/" means DEFAULT_TABLE."""
+    request = getattr(websocket, "request", None)
+    path = request.path if request is not None else getattr(websocket, "path", "/")
+    return urllib.parse.unquote(urllib.parse.urlsplit(path).path.strip("/")) or DEFAULT_TABLE
+
+async def switch_table(websocket, current, table_id):
+    """Move a client to another hosted table and send it that table's game_state.
+    Returns the new table's host, or None if no such table is hosted here."""
+    host = table_hosts.get(table_id)
+    if host is None:
+        await send_error(websocket, f"Unknown table: {table_id}")
+        return None
+    current.leave(websocket)
+    await host.join(websocket)
+    return host
 
-                elif action == "reveal_dealer_banker_cards":
-                    banker_cards[0] = dummy_banker_cards[0]
-                    banker_cards[1] = dummy_banker_cards[1]
+async def handle_message(host, websocket, data):
+    """Check one client action against its declared fields, then queue it on a table hosted by
+    this process and wait until it has run. A message that cannot run never reaches the table."""
+    try:
+        action, handler, fields = parse_action(data)
+    except ValueError as e:
+        host.action_metrics.rejected += 1
+        await send_error(websocket, str(e))
+        return
+    await host.commands.submit(action, lambda: host.action_metrics.run(action, handler, host, websocket, **fields))
 
-                    if not has_unrevealed_cards():
-                        next_recipient = get_next_card_recipient()
-                        if next_recipient == "complete":
-                            await calculate_result()
-                        else:
-                            game_state["game_phase"] = "waiting"
-                            game_state["can_calculate"] = True
+# --- Client actions, run by the table's command queue (at most one game_state frame each) ---
+@client_action("add_card", card=Field(str, "", parse=lambda card: card.strip().upper()))
+async def handle_dealer_card(host, websocket, card):
+    table = host.table
+    if await handle_add_card(host, websocket, card):
+        print(table.player_cards, table.banker_cards, table.dummy_banker_cards, table.dummy_player_cards, sep=", ")
 
-                    await broadcast_game_state()
+@client_action("start_new_game")
+async def handle_new_game(host, websocket):
+    await handle_table_action(host, websocket, host.table.new_game, success="New game started!")
 
-                elif action == "reveal_dealer_player_cards":
-                    player_cards[0] = dummy_player_cards[0]
-                    player_cards[1] = dummy_player_cards[1]
-    
-                    if not has_unrevealed_cards():
-                        next_recipient = get_next_card_recipient()
-                        if next_recipient == "complete":
-                            await calculate_result()
-                        else:
-                            game_state["game_phase"] = "waiting"
-                            game_state["can_calculate"] = True
+@client_action("reset_game")
+async def handle_reset_game(host, websocket):
+    try:
+        await reset_all(host)
+        await send_success(websocket, "Game reset! 416 cards available. Burn card enabled.")
+    except GameError as e:
+        await send_error(websocket, str(e))
+    await host.broadcast_game_state()
+
+# Handlers that take nothing but the table and the client
+client_action("undo")(handle_undo_card)
+client_action("shuffle_cards")(handle_shuffle_cards)
+client_action("delete_last_entry")(delete_last_game_entry)
+# Returns once dealing has started; the hand is dealt by host.auto_dealer
+client_action("auto_deal")(handle_auto_deal)
+
+@client_action("pause_auto_deal")
+async def handle_pause_auto_deal(host, websocket):
+    await handle_table_action(host, websocket, host.auto_dealer.pause, success="Auto-deal paused")
+
+@client_action("resume_auto_deal")
+async def handle_resume_auto_deal(host, websocket):
+    await handle_table_action(host, websocket, host.auto_dealer.resume, success="Auto-deal resumed")
+
+@client_action("cancel_auto_deal")
+async def handle_cancel_auto_deal(host, websocket):
+    await handle_table_action(host, websocket, host.auto_dealer.cancel,
+                              success="Auto-deal cancelled. Start a new game to deal again.")
+
+client_action("set_auto_deal_speed",
+              card_delay=Field(NUMBER, None),
+              shuffle_delay=Field(NUMBER, None))(handle_auto_deal_speed)
+
+@client_action("set_game_mode", mode=Field(str, "manual"))
+async def handle_set_game_mode(host, websocket, mode):
+    await handle_table_action(host, websocket, host.table.set_mode, mode, success=f"Game mode set to {mode}")
+
+client_action("manual_result",
+              winner=Field(str),
+              is_super_six=Field(bool, False),
+              player_pair=Field(bool, False),
+              banker_pair=Field(bool, False),
+              player_natural=Field(bool, False),
+              banker_natural=Field(bool, False))(handle_manual_result)
+
+@client_action("set_vip_player_revealer", player_id=Field((str, int)))
+async def handle_set_vip_player_revealer(host, websocket, player_id):
+    await handle_set_vip_revealer(host, websocket, player_id, PLAYER)
+
+@client_action("set_vip_banker_revealer", player_id=Field((str, int)))
+async def handle_set_vip_banker_revealer(host, websocket, player_id):
+    await handle_set_vip_revealer(host, websocket, player_id, BANKER)
+
+@client_action("update_players", player_id=Field((str, int)), is_active=Field(bool, False))
+async def handle_update_players(host, websocket, player_id, is_active):
+    await handle_table_action(host, websocket, host.table.set_player, player_id, is_active,
+                              success=f"Player {player_id} {'added' if is_active else 'removed'}")
+
+@client_action("set_table_number", table_number=Field(str, "FT-"))
+async def handle_set_table_number(host, websocket, table_number):
+    host.table.state["table_number"] = table_number
+    await send_success(websocket, f"Table number set to {table_number}")
+    await host.broadcast_game_state()
+
+@client_action("set_max_bet", max_bet=Field(NUMBER + (str,), 100000, parse=int))
+async def handle_set_max_bet(host, websocket, max_bet):
+    host.table.state["max_bet"] = max_bet
+    await send_success(websocket, f"Max bet set to {max_bet}")
+    await host.broadcast_game_state()
+
+@client_action("set_min_bet", min_bet=Field(NUMBER + (str,), 10000, parse=int))
+async def handle_set_min_bet(host, websocket, min_bet):
+    host.table.state["min_bet"] = min_bet
+    await send_success(websocket, f"Min bet set to {min_bet}")
+    await host.broadcast_game_state()
+
+@client_action("join_table")
+async def handle_join_table(host, websocket):
+    # The table field has already moved the client, which got a fresh game_state
+    await send_success(websocket, f"Joined table {host.table_id}")
+
+client_action("set_protocol", protocol=Field(str, "full"))(handle_set_protocol)
+
+@client_action("resume", last_seq=Field((int, type(None)), None), protocol=Field(str, None))
+async def handle_resume(host, websocket, last_seq, protocol):
+    # Reconnected client: what it missed since last_seq, on the protocol it was using
+    if protocol == "delta":
+        client_protocols[websocket] = "delta"
+    await host.resume(websocket, last_seq)
+
+@client_action("resync")
+async def handle_resync(host, websocket):
+    # Delta client saw a version gap (or just connected) and needs a full snapshot
+    await host.send_game_state_snapshot(websocket)
+
+@client_action("get_metrics")
+async def handle_get_metrics(host, websocket):
+    await send_frame(websocket, json.dumps({
+        "action": "metrics",
+        "table": host.table_id,
+        "tables": {other_id: len(other.clients) for other_id, other in table_hosts.items()},
+        "broadcast": broadcast_metrics,
+        "coalescing": host.state_broadcasts.counters(),
+        "persistence": host.results_journal.stats(),
+        "database": host.database.stats(),
+        "odds": host.live_odds.metrics,
+        "admission": host.admission_metrics,
+        "commands": host.commands.stats(),
+        "shoe": host.shoe_reader.stats() if host.shoe_reader else None,
+        "actions": host.action_metrics.stats(),
+        "bus": worker_bus.metrics if worker_bus else None
+    }))
+
+@client_action("get_stats")
+async def handle_get_stats(host, websocket):
+    # Kept for clients that still ask; served from the in-memory aggregator
+    await host.broadcast({"action": "stats", **host.stats_aggregator.snapshot()}, [websocket], audience=None)
+
+@client_action("start_burn_card")
+async def handle_start_burn(host, websocket):
+    await handle_table_action(host, websocket, host.table.start_burn, success="Burn mode activated. Next cards will be burned.")
+
+@client_action("end_burn_card")
+async def handle_end_burn(host, websocket):
+    await handle_table_action(host, websocket, host.table.end_burn, success="Burn mode ended.")
+
+@client_action("dealer_final_reveal")
+async def handle_final_reveal(host, websocket):
+    await handle_reveal(host, websocket, host.table.final_reveal)
+
+def reveal_action(side, *positions):
+    async def handle(host, websocket):
+        await handle_reveal(host, websocket, host.table.reveal, side, *positions)
+    return handle
+
+for name, reveal in REVEAL_ACTIONS.items():
+    client_action(name)(reveal_action(*reveal))
 
-                    await broadcast_game_state()
+async def handle_client(websocket):
+    host = table_hosts.get(requested_table(websocket))
+    if host is None:
+        await send_error(websocket, f"Unknown table: {requested_table(websocket)}")
+        await websocket.close()
+        return
+    try:
+        await host.join(websocket)
+        
+        async for message in websocket:
+            try:
+                data = json.loads(message)
+                if not isinstance(data, dict):
+                    await send_error(websocket, "Invalid message")
+                    continue
+
+                # Any message may name the table it is meant for; the client stays on it afterwards
+                table_id = data.get("table")
+                if table_id is not None and table_id != host.table_id:
+                    moved = await switch_table(websocket, host, table_id)
+                    if moved is None:
+                        continue
+                    host = moved
 
+                if isinstance(host, RemoteTable):
+                    host.forward(websocket, data, message)
                 else:
-                    await send_error(websocket, f"Unknown action: {action}")
+                    # A reconnecting client's first message is resume, which answers it instead of the
+                    # admission snapshot; that snapshot would arrive ahead of the older frames replayed
+                    resuming = websocket in host.admitting and data.get("action") == "resume"
+                    if resuming:
+                        host.admitting.remove(websocket)
+                    elif websocket in host.admitting:
+                        await host.admit()  # acting before its batch is due, so admit the batch now
+                    await handle_message(host, websocket, data)
+                    if resuming and websocket not in host.clients:
+                        await host.join(websocket)  # the resume was rejected, admit it the usual way
                     
             except json.JSONDecodeError:
                 await send_error(websocket, "Invalid JSON")
@@ -1280,54 +1824,414 @@ async def handle_client(websocket):
     except Exception as e:
         logging.error(f"Error: {e}")
     finally:
-        connected_clients.discard(websocket)
-
-async def main():
-    await check_connection()
-    
-    # Initialize with full 8-deck shoe (416 cards)
-    global remaining_cards
-    remaining_cards = create_8_deck_shoe()
+        host.leave(websocket)
+        client_protocols.pop(websocket, None)
+
+# --- Worker processes ---
+class RemoteTable:
+    """A table whose game runs in another worker. Only the clients connected to this worker are
+    kept here: their actions are forwarded to the owner over the bus, and the owner's broadcasts
+    come back as encoded frames that are fanned out locally."""
+
+    def __init__(self, table_id, owner):
+        self.table_id = table_id
+        self.owner = owner
+        self.clients = set()
+        self.snapshot_payload = None  # latest full game_state frame relayed from the owner
+
+    async def join(self, websocket):
+        self.clients.add(websocket)
+        if self.snapshot_payload is not None:
+            # Every state change is published as a full frame, so the latest one is current
+            await send_frame(websocket, self.snapshot_payload)
+        else:
+            # Nothing relayed since this worker started: the owner answers with a game_state
+            worker_bus.forward(self.owner, self.table_id, websocket, json.dumps({"action": "resync"}))
+
+    def leave(self, websocket):
+        self.clients.discard(websocket)
+        worker_bus.client_left(self.owner, websocket)
+
+    def forward(self, websocket, data, message):
+        if data.get("action") == "set_protocol":
+            # Relayed frames are picked per protocol here, so mirror what the owner will accept
+            if data.get("protocol") == "delta":
+                client_protocols[websocket] = "delta"
+            elif data.get("protocol", "full") == "full":
+                client_protocols.pop(websocket, None)
+        elif data.get("action") == "resume" and data.get("protocol") == "delta":
+            client_protocols[websocket] = "delta"
+        worker_bus.forward(self.owner, self.table_id, websocket, message)
+
+    async def deliver(self, audience, payload):
+        if audience == "full":
+            self.snapshot_payload = payload
+        if audience == "all":
+            clients = self.clients
+        elif audience == "delta":
+            clients = [websocket for websocket in self.clients if client_protocols.get(websocket) == "delta"]
+        else:
+            clients = [websocket for websocket in self.clients if client_protocols.get(websocket) != "delta"]
+        dropped = await broadcast(None, clients, payload)
+        self.clients.difference_update(dropped)
+
+class RemoteClient:
+    """Owner-side stand-in for a client connected to another worker. handle_message() talks to
+    it like to a websocket and whatever it sends goes back over the bus. Its commands run one at
+    a time in arrival order, as they would on the client's own connection."""
+
+    def __init__(self, bus, worker, client_id):
+        self.bus = bus
+        self.worker = worker
+        self.client_id = client_id
+        self.remote_address = (f"worker-{worker}", client_id)
+        self.commands = asyncio.Queue()
+        self.task = asyncio.create_task(self.run())
+
+    async def send(self, payload):
+        self.bus.send(self.worker, {"type": "reply", "client": self.client_id}, payload)
+
+    async def close(self):
+        self.bus.send(self.worker, {"type": "close", "client": self.client_id})
+
+    async def run(self):
+        while True:
+            command = await self.commands.get()
+            if command is None:
+                return  # the client disconnected and everything it sent has been handled
+            table_id, message = command
+            host = table_hosts.get(table_id)
+            try:
+                await handle_message(host, self, json.loads(message))
+            except Exception as e:
+                logging.error(f"Error handling forwarded action for table {table_id}: {e}")
+
+class WorkerBus:
+    """This worker's connection to the bus hub.
+
+    The owner of a table publishes each broadcast frame once and every other worker delivers
+    it to its own clients of that table; client actions travel the other way and are answered
+    through RemoteClient. Frames arrive in the order the owner wrote them."""
+
+    def __init__(self, worker, path):
+        self.worker = worker
+        self.path = path
+        self.writer = None
+        self.task = None
+        self.clients = {}  # client id -> local websocket with actions forwarded to another worker
+        self.proxies = {}  # (worker, client id) -> RemoteClient for tables owned here
+        self.metrics = {"sent": 0, "received": 0, "bytes_sent": 0, "frames_published": 0, "commands_forwarded": 0}
+
+    async def connect(self):
+        reader, self.writer = await asyncio.open_unix_connection(self.path)
+        self.writer.write(BUS_HEADER.pack(0, self.worker))  # hello: tells the hub who this is
+        self.task = asyncio.create_task(self.run(reader))
+
+    def send(self, to, envelope, payload=""):
+        body = json.dumps({**envelope, "from": self.worker}).encode() + b"\n" + payload.encode()
+        self.writer.write(BUS_HEADER.pack(len(body), to) + body)
+        self.metrics["sent"] += 1
+        self.metrics["bytes_sent"] += len(body)
+
+    def publish_frame(self, table_id, audience, payload):
+        self.send(BUS_ALL, {"type": "frame", "table": table_id, "audience": audience}, payload)
+        self.metrics["frames_published"] += 1
+
+    def forward(self, owner, table_id, websocket, message):
+        self.clients[id(websocket)] = websocket
+        self.send(owner, {"type": "command", "table": table_id, "client": id(websocket)}, message)
+        self.metrics["commands_forwarded"] += 1
+
+    def client_left(self, owner, websocket):
+        if self.clients.pop(id(websocket), None) is not None:
+            self.send(owner, {"type": "closed", "client": id(websocket)})
+
+    async def run(self, reader):
+        try:
+            while True:
+                length, _ = BUS_HEADER.unpack(await reader.readexactly(BUS_HEADER.size))
+                envelope, _, payload = (await reader.readexactly(length)).partition(b"\n")
+                self.metrics["received"] += 1
+                try:
+                    await self.dispatch(json.loads(envelope), payload.decode())
+                except Exception as e:
+                    logging.error(f"Error handling worker bus message: {e}")
+        except asyncio.IncompleteReadError:
+            logging.error("Lost the connection to the worker bus")
+
+    async def dispatch(self, envelope, payload):
+        kind = envelope["type"]
+        if kind == "frame":
+            host = table_hosts.get(envelope["table"])
+            if isinstance(host, RemoteTable):
+                await host.deliver(envelope["audience"], payload)
+        elif kind == "command":
+            key = (envelope["from"], envelope["client"])
+            proxy = self.proxies.get(key)
+            if proxy is None:
+                proxy = self.proxies[key] = RemoteClient(self, *key)
+            proxy.commands.put_nowait((envelope["table"], payload))
+        elif kind == "closed":
+            proxy = self.proxies.pop((envelope["from"], envelope["client"]), None)
+            if proxy:
+                client_protocols.pop(proxy, None)
+                proxy.commands.put_nowait(None)
+        elif kind == "reply":
+            websocket = self.clients.get(envelope["client"])
+            if websocket:
+                await send_frame(websocket, payload)
+        elif kind == "close":
+            websocket = self.clients.get(envelope["client"])
+            if websocket:
+                asyncio.ensure_future(websocket.close())
+
+class BusHub:
+    """Relay between the worker processes, run by the supervisor. Frames are routed on their
+    BUS_HEADER destination alone and never decoded; frames for a worker that has not connected
+    yet wait for it."""
+
+    def __init__(self):
+        self.writers = {}
+        self.waiting = {}
+
+    async def handle(self, reader, writer):
+        _, worker = BUS_HEADER.unpack(await reader.readexactly(BUS_HEADER.size))
+        self.writers[worker] = writer
+        for frame in self.waiting.pop(worker, []):
+            writer.write(frame)
+        try:
+            while True:
+                header = await reader.readexactly(BUS_HEADER.size)
+                length, to = BUS_HEADER.unpack(header)
+                frame = header + await reader.readexactly(length)
+                if to == BUS_ALL:
+                    for other, target in self.writers.items():
+                        if other != worker:
+                            target.write(frame)
+                elif to in self.writers:
+                    self.writers[to].write(frame)
+                else:
+                    self.waiting.setdefault(to, []).append(frame)
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            logging.warning(f"Worker {worker} left the bus")
+        finally:
+            self.writers.pop(worker, None)
+
+def table_owner(table_id, workers):
+    """Worker that runs a table's game: tables are dealt out round-robin in TABLES order."""
+    return list(TABLES).index(table_id) % workers
+
+def run_worker(worker, workers, bus_path):
+    asyncio.run(main(worker, workers, bus_path))
+
+async def supervise(workers):
+    """Start the bus hub and `workers` worker processes, and stop everything if one of them dies."""
+    bus_path = os.path.join(tempfile.gettempdir(), f"baccarat-bus-{os.getpid()}.sock")
+    hub = BusHub()
+    await asyncio.start_unix_server(hub.handle, bus_path)
+    # spawn, so each worker opens its own MongoDB client instead of inheriting this one's
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=run_worker, args=(worker, workers, bus_path), name=f"baccarat-worker-{worker}", daemon=True)
+        for worker in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    print(f"Supervising {workers} worker processes, bus on {bus_path}")
+    try:
+        while all(process.is_alive() for process in processes):
+            await asyncio.sleep(1)
+        logging.error("A worker process exited, shutting down")
+    finally:
+        for process in processes:
+            process.terminate()
+        os.unlink(bus_path)
+
+async def main(worker=0, workers=1, bus_path=None):
+    global worker_bus
+    if bus_path:
+        for table_id in TABLES:
+            if table_owner(table_id, workers) != worker:
+                table_hosts[table_id] = RemoteTable(table_id, table_owner(table_id, workers))
+        worker_bus = WorkerBus(worker, bus_path)
+        await worker_bus.connect()
+    hosts = [host for host in table_hosts.values() if isinstance(host, TableHost)]
+    connected = bool(hosts) and await check_connection(hosts[0].database)
+    for host in hosts:
+        entries = host.results_journal.restore()
+        ready = False
+        if connected:
+            try:
+                await host.setup_database()
+                ready = True
+            except Exception as e:
+                logging.error(f"Error setting up table {host.table_id} in MongoDB, retrying after the first flush: {e}")
+        if not ready:
+            # Only the WAL is counted until the journal reaches MongoDB and setup_database() runs
+            host.stats_aggregator.replay(entries)
+            host.results_journal.on_ready = host.setup_database
+        host.results_journal.start()
+    asyncio.create_task(reconcile_stats_periodically())
     
-    print(f"Baccarat WebSocket server running on localhost:6789")
-    print(f"Initialized with {len(remaining_cards)} cards")
+    print(f"Baccarat WebSocket server running on localhost:6789" + (f" (worker {worker})" if bus_path else ""))
+    for host in hosts:
+        print(f"Table {host.table_id}: initialized with {len(host.table.shoe)} cards, results in {host.database.collection.name}")
     
-    # Run both WebSocket server and serial reader concurrently
+    # Run the WebSocket server and every table's serial reader concurrently
     # server = websockets.serve(handle_client, "0.0.0.0", 6789)
     # print("WebSocket server running on ws://0.0.0.0:6789")
 
-    server = websockets.serve(handle_client, "192.168.2.190",6789)
+    # In worker mode every worker listens on the same port and the kernel spreads the connections
+    server = websockets.serve(handle_client, "192.168.2.190",6789, reuse_port=bus_path is not None)
     print("WebSocket server running on ws://192.168.2.190:6789")
 
-    
-    if ser:
-        print(f"Connected to shoe reader on {ser.name}")
-        await asyncio.gather(server, read_from_serial())  # Run both tasks concurrently
-    else:
-        print("Shoe reader not connected, running WebSocket server only")
-        await asyncio.gather(server, asyncio.Future())  # Run only WebSocket server
-
-# --- MongoDB stat aggregation functions ---
-async def get_banker_wins():
-    return await collection.count_documents({"winner": "banker"})
-
-async def get_player_wins():
-    return await collection.count_documents({"winner": "player"})
-
-async def get_ties():
-    return await collection.count_documents({"winner": "tie"})
-
-async def get_player_pairs():
-    return await collection.count_documents({"player_pair": True})
+    readers = []
+    for host in hosts:
+        ser = open_serial(host.serial_port) if host.serial_port else None
+        if ser:
+            print(f"Table {host.table_id}: connected to shoe reader on {ser.name}")
+            readers.append(read_from_serial(host, ser))
+        else:
+            print(f"Table {host.table_id}: shoe reader not connected")
+    await asyncio.gather(server, *readers, asyncio.Future())  # the Future keeps the server up without readers
+
+# --- MongoDB stat aggregation ---
+# One pass over game_results producing every counter the stats frame needs
+STATS_PIPELINE = [
+    {"$group": {
+        "_id": None,
+        "banker_wins": {"$sum": {"$cond": [{"$eq": ["$winner", "banker"]}, 1, 0]}},
+        "player_wins": {"$sum": {"$cond": [{"$eq": ["$winner", "player"]}, 1, 0]}},
+        "ties": {"$sum": {"$cond": [{"$eq": ["$winner", "tie"]}, 1, 0]}},
+        "player_pairs": {"$sum": {"$cond": [{"$eq": ["$player_pair", True]}, 1, 0]}},
+        "banker_pairs": {"$sum": {"$cond": [{"$eq": ["$banker_pair", True]}, 1, 0]}},
+        "player_naturals": {"$sum": {"$cond": [
+            {"$and": [{"$eq": ["$winner", "player"]}, {"$eq": ["$player_natural", True]}]}, 1, 0]}},
+        "banker_naturals": {"$sum": {"$cond": [
+            {"$and": [{"$eq": ["$winner", "banker"]}, {"$eq": ["$banker_natural", True]}]}, 1, 0]}},
+        "super_sixes": {"$sum": {"$cond": [{"$eq": ["$is_super_six", True]}, 1, 0]}},
+        "total_games": {"$sum": 1},
+    }}
+]
+
+class StatsAggregator:
+    """In-memory stats counters for game_results.
+
+    Seeded once from STATS_PIPELINE and then kept current by add/remove/clear as rounds are
+    saved, undone or wiped, so reading the stats never touches MongoDB. total_games doubles as
+    the locally tracked row count of game_results."""
+
+    FIELDS = ("banker_wins", "player_wins", "ties", "player_pairs", "banker_pairs",
+              "player_naturals", "banker_naturals", "super_sixes", "total_games")
+
+    def __init__(self):
+        self.counts = dict.fromkeys(self.FIELDS, 0)
+        self.version = 0  # bumped on every local change, used to skip racy reconciliations
+
+    @staticmethod
+    def contributions(doc):
+        winner = doc.get("winner")
+        return {
+            "banker_wins": winner == "banker",
+            "player_wins": winner == "player",
+            "ties": winner == "tie",
+            "player_pairs": doc.get("player_pair") is True,
+            "banker_pairs": doc.get("banker_pair") is True,
+            "player_naturals": winner == "player" and doc.get("player_natural") is True,
+            "banker_naturals": winner == "banker" and doc.get("banker_natural") is True,
+            "super_sixes": doc.get("is_super_six") is True,
+            "total_games": True,
+        }
 
-async def get_banker_pairs():
-    return await collection.count_documents({"banker_pair": True})
+    def add(self, doc, sign=1):
+        for field, hit in self.contributions(doc).items():
+            if hit:
+                self.counts[field] = max(0, self.counts[field] + sign)
+        self.version += 1
+
+    def remove(self, doc):
+        self.add(doc, sign=-1)
+
+    def clear(self):
+        self.counts = dict.fromkeys(self.FIELDS, 0)
+        self.version += 1
+
+    def replay(self, entries):
+        """Apply write-behind journal entries that MongoDB has not seen yet on top of the counters."""
+        for op, doc in entries:
+            if op == "insert":
+                self.add(doc)
+            elif op == "delete":
+                self.remove(doc)
+            else:
+                self.clear()
+
+    def snapshot(self):
+        return dict(self.counts)
+
+    def has_history(self):
+        """True if game_results holds at least one game (what canUndoLastWin reports)."""
+        return self.counts["total_games"] > 0
+
+    async def aggregate(self, database):
+        """Run STATS_PIPELINE and return the counters as stored in MongoDB."""
+        results = await database.aggregate(STATS_PIPELINE)
+        row = results[0] if results else {}
+        return {field: row.get(field, 0) for field in self.FIELDS}
+
+    async def load(self, database, unstored=None):
+        """Seed the counters from MongoDB, then apply the journal entries `unstored()` returns.
+        Both are read before anything is assigned, so a round saved meanwhile (still in the
+        journal) is counted exactly once."""
+        counts = await self.aggregate(database)
+        entries = await unstored() if unstored else []
+        self.counts = counts
+        self.version += 1
+        self.replay(entries)
+        logging.info(f"Stats loaded from {database.collection.name}: {self.counts}")
+
+    async def reconcile(self, database):
+        """Compare the in-memory counters with MongoDB and adopt MongoDB's values on drift.
+        Returns True if drift was found."""
+        version = self.version
+        stored = await self.aggregate(database)
+        if version != self.version:
+            return False  # a round was saved or removed mid-aggregation, try again next time
+        drift = {field: (self.counts[field], stored[field]) for field in self.FIELDS if self.counts[field] != stored[field]}
+        if not drift:
+            return False
+        logging.warning(f"Stats drift detected (memory, mongo): {drift}")
+        self.counts = stored
+        self.version += 1
+        return True
 
-async def get_player_naturals():
-    return await collection.count_documents({"winner": "player", "player_natural": True})
+database_breaker = CircuitBreaker()
+table_hosts = {
+    table_id: TableHost(table_id, DatabaseGateway(client, db[config["collection"]], database_breaker), config.get("serial_port"))
+    for table_id, config in TABLES.items()
+}
 
-async def get_banker_naturals():
-    return await collection.count_documents({"winner": "banker", "banker_natural": True})
+async def reconcile_stats_periodically():
+    while True:
+        await asyncio.sleep(STATS_RECONCILE_INTERVAL)
+        for host in table_hosts.values():
+            if not isinstance(host, TableHost) or host.results_journal.pending:
+                continue  # MongoDB is behind the journal, so a comparison now would report false drift
+            try:
+                if await host.stats_aggregator.reconcile(host.database):
+                    await host.broadcast_refresh_stats()
+            except Exception as e:
+                logging.error(f"Error reconciling table {host.table_id} stats with MongoDB: {e}")
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Baccarat table WebSocket server")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="worker processes sharing the port (Linux only); tables are split between them")
+    args = parser.parse_args()
+    if args.workers > 1 and not (hasattr(socket, "SO_REUSEPORT") and hasattr(socket, "AF_UNIX")):
+        logging.warning("Worker mode needs SO_REUSEPORT and Unix sockets, running a single process")
+        args.workers = 1
+    if args.workers > 1:
+        asyncio.run(supervise(args.workers))
+    else:
+        asyncio.run(main())
\ No newline at end of file
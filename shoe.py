@@ -0,0 +1,124 @@
+import random
+from array import array
+
+# Cards are coded as small integers: code = rank index * 4 + suit index
+RANKS = "A23456789TJQK"
+SUITS = "HDCS"
+CARD_NAMES = [rank + suit for rank in RANKS for suit in SUITS]
+CARD_CODES = {name: code for code, name in enumerate(CARD_NAMES)}
+# Baccarat value of each code: A=1, 2-9 face value, T/J/Q/K=0
+CARD_VALUES = bytes(1 if rank == "A" else (0 if rank in "TJQK" else int(rank)) for rank in RANKS for _ in SUITS)
+
+
+def card_code(card):
+    return CARD_CODES[card]
+
+
+def card_name(code):
+    return CARD_NAMES[code]
+
+
+class Shoe:
+    """Multi-deck shoe stored as integer card codes in one contiguous array.
+
+    Slots keep the shuffled dealing order. A card taken out of the shoe (drawn from the front,
+    or removed by identity when the dealer or shoe reader reports it) only has its slot marked
+    dead, and undo takes the last slot off that card's own taken list, so draw, remove and undo
+    are O(1) - the per-code slot lists never hold more than `decks` entries. Composition is kept as counts per card code and per baccarat value.
+    Shuffling refills the same buffers, so a shoe is allocated once for its deck count."""
+
+    def __init__(self, decks=8, rng=random):
+        self.decks = decks
+        self.capacity = decks * 52
+        self.rng = rng
+        self.cards = array("B", bytes(self.capacity))  # card code in each slot, in dealing order
+        self.live = bytearray(self.capacity)  # 1 while the slot's card is still in the shoe
+        self.slots = [[] for _ in range(52)]  # live slots per card code, nearest the front first
+        self.counts = array("H", bytes(2 * 52))  # cards left per card code
+        self.value_counts = array("H", bytes(2 * 10))  # cards left per baccarat value
+        self.taken = [[] for _ in range(52)]  # taken slots per card code, most recent last, for undo
+        self.front = 0  # no live slot before this index
+        self.remaining = 0
+        self.shuffle()
+
+    def shuffle(self):
+        """Refill the shoe with `decks` full decks and shuffle it in place."""
+        cards = self.cards
+        for slot in range(self.capacity):
+            cards[slot] = slot % 52
+        self.rng.shuffle(cards)
+        for slots in self.slots:
+            slots.clear()
+        for slot in range(self.capacity):
+            self.slots[cards[slot]].append(slot)
+            self.live[slot] = 1
+        for code in range(52):
+            self.counts[code] = self.decks
+        for value in range(10):
+            self.value_counts[value] = 0
+        for code in range(52):
+            self.value_counts[CARD_VALUES[code]] += self.decks
+        for slots in self.taken:
+            slots.clear()
+        self.front = 0
+        self.remaining = self.capacity
+
+    def __len__(self):
+        return self.remaining
+
+    @property
+    def used(self):
+        return self.capacity - self.remaining
+
+    def count(self, code):
+        """How many copies of this card are still in the shoe."""
+        return self.counts[code]
+
+    def rank_counts(self):
+        """Cards left per rank (A..K), for pair odds."""
+        return [sum(self.counts[rank * 4:rank * 4 + 4]) for rank in range(13)]
+
+    def _take(self, slot):
+        code = self.cards[slot]
+        self.live[slot] = 0
+        self.counts[code] -= 1
+        self.value_counts[CARD_VALUES[code]] -= 1
+        self.remaining -= 1
+        self.taken[code].append(slot)
+        return code
+
+    def draw(self):
+        """Take the next card off the front of the shoe. Returns its code, or None if the shoe is empty."""
+        while self.front < self.capacity and not self.live[self.front]:
+            self.front += 1
+        if self.front == self.capacity:
+            return None
+        code = self.cards[self.front]
+        self.slots[code].pop(0)
+        return self._take(self.front)
+
+    def remove(self, code):
+        """Take a specific card out of the shoe (the copy nearest the front). False if none is left."""
+        slots = self.slots[code]
+        if not slots:
+            return False
+        self._take(slots.pop(0))
+        return True
+
+    def undo(self, code):
+        """Put the most recently taken copy of this card back into its original slot.
+        False if no copy of it was taken since the last shuffle."""
+        if not self.taken[code]:
+            return False
+        slot = self.taken[code].pop()
+        slots = self.slots[code]
+        position = 0
+        while position < len(slots) and slots[position] < slot:
+            position += 1
+        slots.insert(position, slot)
+        self.live[slot] = 1
+        self.counts[code] += 1
+        self.value_counts[CARD_VALUES[code]] += 1
+        self.remaining += 1
+        self.front = min(self.front, slot)
+        return True
@@ -0,0 +1,186 @@
+import argparse
+import random
+import re
+import time
+from collections import Counter, namedtuple
+
+from shoe import CARD_CODES, CARD_NAMES
+
+# What the shoe reader sends, one frame per line: an optional bracketed header saying what
+# the card is for, then the card, e.g. "[Manual Burn Cards]<Card:7H>". A header on its own
+# reports an event such as "[Shoe End]" or "[Error]Card misread".
+DEAL, BURN, SHOE_END, ERROR = "deal", "burn", "shoe_end", "error"
+FRAME_KINDS = (DEAL, BURN, SHOE_END, ERROR)
+Frame = namedtuple("Frame", "kind card detail")  # card is a code like "7H", None for events
+
+# Header keywords (lower case) and the kind of frame they mark; any other header deals the card
+HEADER_KINDS = (("burn", BURN), ("shoe end", SHOE_END), ("end of shoe", SHOE_END), ("error", ERROR))
+
+MAX_TOKEN_BYTES = 64  # a header or card longer than this is line noise, not a frame
+TOKEN = re.compile(rb"\[([^\[\]<>\r\n]{0,%d})\]|<Card:([^\[\]<>\r\n]{0,%d})>|\n" % (MAX_TOKEN_BYTES, MAX_TOKEN_BYTES))
+
+
+def header_kind(header):
+    header = header.lower()
+    for keyword, kind in HEADER_KINDS:
+        if keyword in header:
+            return kind
+    return DEAL
+
+
+class ShoeParser:
+    """Incremental parser of the shoe reader's byte stream.
+
+    feed() takes whatever one serial read returned (part of a frame, several frames, bytes of
+    line noise) and returns the frames it completed, in order. A card frame is complete as
+    soon as its closing ">" arrives; a header without a card at the end of its line. Only "\n"
+    ends a line: the reader may send a header and its card in separate writes, so a pause in
+    the stream, however long, keeps the header waiting. Anything outside a header or card
+    token is skipped and counted in counts["noise_bytes"]."""
+
+    def __init__(self):
+        self.buffer = b""  # start of a token cut off at the end of the last read
+        self.header = None  # header of the current line
+        self.header_used = False
+        self.counts = Counter()
+
+    def feed(self, data):
+        buffer = self.buffer + data if self.buffer else data
+        frames = []
+        position = 0
+        for match in TOKEN.finditer(buffer):
+            if match.start() > position:
+                self.counts["noise_bytes"] += len(buffer[position:match.start()].strip())
+            position = match.end()
+            header, card = match.groups()
+            if card is not None:
+                frames.append(self._card_frame(card))
+            elif header is not None:
+                self.header = header.decode("ascii", "replace").strip()
+                self.header_used = False
+            else:
+                self._end_line(frames)
+
+        rest = buffer[position:]
+        start = max(rest.rfind(b"["), rest.rfind(b"<"))
+        if start >= 0 and len(rest) - start <= MAX_TOKEN_BYTES + len(b"<Card:>"):
+            self.buffer = rest[start:]
+            rest = rest[:start]
+        else:
+            self.buffer = b""
+        self.counts["noise_bytes"] += len(rest.strip())
+        return frames
+
+    def _card_frame(self, card):
+        card = card.decode("ascii", "replace").strip().upper()
+        kind = header_kind(self.header) if self.header else DEAL
+        self.header_used = True
+        if card not in CARD_CODES:
+            kind, card, detail = ERROR, None, f"Invalid card: {card}"
+        else:
+            detail = self.header
+        self.counts[kind] += 1
+        return Frame(kind, card, detail)
+
+    def _end_line(self, frames):
+        if self.header is not None and not self.header_used:
+            kind = header_kind(self.header)
+            if kind in (SHOE_END, ERROR):
+                self.counts[kind] += 1
+                frames.append(Frame(kind, None, self.header))
+            else:
+                self.counts["noise_bytes"] += len(self.header) + 2  # a card header without its card
+        self.header = None
+        self.header_used = False
+
+
+def parse(data, chunk_sizes=None):
+    """All frames in `data`, fed to a fresh parser whole or in chunks of the given sizes (cycled)."""
+    parser = ShoeParser()
+    if not chunk_sizes:
+        return parser.feed(data), parser.counts
+    frames = []
+    position = 0
+    index = 0
+    while position < len(data):
+        size = chunk_sizes[index % len(chunk_sizes)]
+        frames.extend(parser.feed(data[position:position + size]))
+        position += size
+        index += 1
+    return frames, parser.counts
+
+
+def synthetic_capture(frames=100000, noise=0.02, seed=1):
+    """Bytes as a shoe reader might send them, with the frames they should parse to. A share
+    `noise` of the lines get a burst of random bytes (no frame characters) in front of them."""
+    rng = random.Random(seed)
+    parts = []
+    expected = []
+    for _ in range(frames):
+        if rng.random() < noise:
+            parts.append(bytes(rng.choice(b"\x00\xff#*~ .:;abcxyz0123456789") for _ in range(rng.randrange(1, 24))))
+        roll = rng.random()
+        card = rng.choice(CARD_NAMES)
+        if roll < 0.90:
+            parts.append(b"<Card:%s>\r\n" % card.encode())
+            expected.append(Frame(DEAL, card, None))
+        elif roll < 0.97:
+            parts.append(b"[Manual Burn Cards]<Card:%s>\r\n" % card.encode())
+            expected.append(Frame(BURN, card, "Manual Burn Cards"))
+        elif roll < 0.99:
+            parts.append(b"[Shoe End]\r\n")
+            expected.append(Frame(SHOE_END, None, "Shoe End"))
+        else:
+            parts.append(b"[Error]Card misread\r\n")
+            expected.append(Frame(ERROR, None, "Error"))
+    return b"".join(parts), expected
+
+
+def self_check(frames=20000, seed=3):
+    """Parse a synthetic capture whole and in random serial-sized chunks; both must give the
+    frames it was generated from."""
+    data, expected = synthetic_capture(frames, seed=seed)
+    rng = random.Random(seed)
+    for chunk_sizes in (None, [1], [rng.randrange(1, 64) for _ in range(101)]):
+        parsed, _ = parse(data, chunk_sizes)
+        assert parsed == expected, (chunk_sizes and chunk_sizes[:5], len(parsed), len(expected))
+    return frames
+
+
+def benchmark(data, chunk_sizes, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        frames, counts = parse(data, chunk_sizes)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return frames, counts, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay shoe reader captures through the frame parser")
+    parser.add_argument("captures", nargs="*", help="raw bytes recorded from a shoe reader (SHOE_CAPTURE_DIR)")
+    parser.add_argument("--chunk", type=int, default=0, help="bytes per simulated serial read (0: random 1-63)")
+    parser.add_argument("--frames", type=int, default=200000, help="size of the synthetic capture used without files")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"Chunked parsing agrees with the generated frames on {self_check()} synthetic frames")
+    rng = random.Random(args.seed)
+    chunk_sizes = [args.chunk] if args.chunk else [rng.randrange(1, 64) for _ in range(1009)]
+    captures = [(path, open(path, "rb").read()) for path in args.captures]
+    if not captures:
+        captures = [(f"synthetic ({args.frames} frames)", synthetic_capture(args.frames, seed=args.seed)[0])]
+
+    for name, data in captures:
+        frames, counts, elapsed = benchmark(data, chunk_sizes, args.repeat)
+        print(f"{name}: {len(data) / 1e6:.2f} MB, {len(frames)} frames in {elapsed * 1000:.1f} ms "
+              f"({len(data) / elapsed / 1e6:.1f} MB/s, {len(frames) / elapsed / 1e6:.2f} M frames/s)")
+        for kind in FRAME_KINDS:
+            print(f"  {kind:10} {counts[kind]}")
+        print(f"  noise      {counts['noise_bytes']} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from baccarat_rules import BANKER, COMPLETE, NEXT_CARD, NO_THIRD_CARD, PLAYER, Coup, next_card
+from shoe import CARD_VALUES
+
+SIM_DECKS = 8
+SIM_CUT_CARD = 52  # stop dealing a shoe once fewer cards than this are left, as the table offers a shuffle
+SIM_BATCH_SHOES = 4096  # shoes dealt side by side in one set of arrays
+BANKER_COMMISSION = 0.05  # used for the banker edge in summarize()
+
+# Rule tables from baccarat_rules as arrays: who gets the next card coded 0/1/2
+_RECIPIENTS = (PLAYER, BANKER, COMPLETE)
+AFTER_DEAL = np.array([_RECIPIENTS.index(next_card(p, b)) for p in range(10) for b in range(10)], dtype=np.int8)
+AFTER_THIRD = np.array([_RECIPIENTS.index(recipient) for recipient in NEXT_CARD], dtype=np.int8)
+VALUES = np.frombuffer(CARD_VALUES, dtype=np.uint8)
+RANKS = np.arange(52, dtype=np.uint8) // 4
+
+# Winner codes in the result arrays; -1 marks a slot where the shoe had already ended
+WINNERS = ("player", "banker", "tie")
+
+
+def deal_shoes(shoes, decks=SIM_DECKS, cut_card=SIM_CUT_CARD, rng=None):
+    """Shuffle and deal `shoes` complete shoes at once.
+
+    Every shoe is one row of a card-code matrix and the hands are dealt as whole columns:
+    each step gathers the next six cards of every live shoe, applies the drawing tables and
+    advances each shoe by the 4-6 cards its hand used. Returns a dict of (shoes, hands)
+    arrays holding the fields save_game_result() stores; winner is -1 past the end of a shoe."""
+    rng = np.random.default_rng(rng)
+    capacity = decks * 52
+    cards = rng.permuted(np.tile(np.arange(52, dtype=np.uint8), (shoes, decks)), axis=1)
+    # Flattened, with six spare cards per shoe so a window never runs past its row
+    stride = capacity + 6
+    padded = np.zeros((shoes, stride), dtype=np.uint8)
+    padded[:, :capacity] = cards
+    values = VALUES[padded].ravel().astype(np.int16)
+    ranks = RANKS[padded].ravel()
+    position = np.arange(shoes, dtype=np.int64) * stride
+    end = position + capacity
+    max_hands = (capacity - cut_card) // 4 + 1
+    winner = np.full((shoes, max_hands), -1, dtype=np.int8)
+    fields = {name: np.zeros((shoes, max_hands), dtype=bool) for name in (
+        "is_super_six", "player_pair", "banker_pair", "player_natural", "banker_natural")}
+
+    for hand in range(max_hands):
+        # Every shoe is dealt every step; shoes past the cut card are masked out of the results
+        live = end - position >= max(cut_card, 6)
+        if not live.any():
+            break
+        v0, v1, v2, v3, v4, v5 = (values[position + offset] for offset in range(6))
+
+        player_total = (v0 + v2) % 10
+        banker_total = (v1 + v3) % 10
+        following = AFTER_DEAL[player_total * 10 + banker_total]
+        player_draws = following == 0
+        player_final = np.where(player_draws, (player_total + v4) % 10, player_total)
+        third = np.where(player_draws, v4, NO_THIRD_CARD)
+        after_third = AFTER_THIRD[(player_final * 10 + banker_total) * 11 + third]
+        banker_draws = np.where(player_draws, after_third == 1, following == 1)
+        banker_third = np.where(player_draws, v5, v4)
+        banker_final = np.where(banker_draws, (banker_total + banker_third) % 10, banker_total)
+
+        outcome = np.where(player_final > banker_final, 0, np.where(banker_final > player_final, 1, 2))
+        winner[:, hand] = np.where(live, outcome, -1)
+        fields["is_super_six"][:, hand] = live & (banker_final == 6) & (banker_final > player_final)
+        fields["player_pair"][:, hand] = live & (ranks[position] == ranks[position + 2]) & ~player_draws
+        fields["banker_pair"][:, hand] = live & (ranks[position + 1] == ranks[position + 3]) & ~banker_draws
+        fields["player_natural"][:, hand] = live & (player_total >= 8) & (player_total > banker_total)
+        fields["banker_natural"][:, hand] = live & (banker_total >= 8) & (banker_total > player_total)
+        position += live * (4 + player_draws + banker_draws)
+
+    return {"winner": winner, **fields, "cards": cards}
+
+
+def records(results):
+    """Yield one dict per dealt hand with the fields save_game_result() writes (minus timestamp),
+    rounds numbered from 1 within each shoe."""
+    winner = results["winner"]
+    for shoe in range(winner.shape[0]):
+        for hand in range(winner.shape[1]):
+            code = winner[shoe, hand]
+            if code < 0:
+                break
+            yield {
+                "winner": WINNERS[code],
+                "round": hand + 1,
+                "is_super_six": bool(results["is_super_six"][shoe, hand]),
+                "player_pair": bool(results["player_pair"][shoe, hand]),
+                "banker_pair": bool(results["banker_pair"][shoe, hand]),
+                "player_natural": bool(results["player_natural"][shoe, hand]),
+                "banker_natural": bool(results["banker_natural"][shoe, hand]),
+            }
+
+
+def _streaks(winner, code, longest):
+    """Add the lengths of every run of `code` wins to a histogram; ties do not break a run."""
+    counts = np.zeros(longest + 1, dtype=np.int64)
+    run = np.zeros(winner.shape[0], dtype=np.int64)
+    longest_per_shoe = np.zeros(winner.shape[0], dtype=np.int64)
+    for hand in range(winner.shape[1]):
+        column = winner[:, hand]
+        ended = (column >= 0) & (column != code) & (column != 2) & (run > 0)
+        counts += np.bincount(run[ended], minlength=longest + 1)
+        run[ended] = 0
+        run[column == code] += 1
+        np.maximum(longest_per_shoe, run, out=longest_per_shoe)
+    counts += np.bincount(run[run > 0], minlength=longest + 1)
+    return counts, np.bincount(longest_per_shoe, minlength=longest + 1)
+
+
+def tally(results):
+    """Count totals and streaks for one batch; tallies from several batches add up with merge()."""
+    winner = results["winner"]
+    longest = winner.shape[1]
+    banker_runs, banker_longest = _streaks(winner, 1, longest)
+    player_runs, player_longest = _streaks(winner, 0, longest)
+    return {
+        "shoes": winner.shape[0],
+        "total_games": int((winner >= 0).sum()),
+        "player_wins": int((winner == 0).sum()),
+        "banker_wins": int((winner == 1).sum()),
+        "ties": int((winner == 2).sum()),
+        "super_sixes": int(results["is_super_six"].sum()),
+        "player_pairs": int(results["player_pair"].sum()),
+        "banker_pairs": int(results["banker_pair"].sum()),
+        "player_naturals": int(results["player_natural"].sum()),
+        "banker_naturals": int(results["banker_natural"].sum()),
+        "banker_streaks": banker_runs,
+        "player_streaks": player_runs,
+        "longest_banker_streak": banker_longest,
+        "longest_player_streak": player_longest,
+    }
+
+
+def merge(first, second):
+    merged = {}
+    for key, value in first.items():
+        other = second[key]
+        if isinstance(value, np.ndarray):
+            size = max(len(value), len(other))
+            value = np.pad(value, (0, size - len(value)))
+            other = np.pad(other, (0, size - len(other)))
+        merged[key] = value + other
+    return merged
+
+
+def summarize(totals):
+    """Hit rates and house edge per unit bet from merged tallies. Ties push Player and Banker
+    bets; the banker edge assumes BANKER_COMMISSION on every banker win."""
+    games = totals["total_games"]
+    rate = {key: totals[key] / games for key in (
+        "player_wins", "banker_wins", "ties", "super_sixes", "player_pairs", "banker_pairs",
+        "player_naturals", "banker_naturals")}
+    return {
+        "shoes": totals["shoes"],
+        "total_games": games,
+        "rates": rate,
+        "player_edge": rate["banker_wins"] - rate["player_wins"],
+        "banker_edge": rate["player_wins"] - (1 - BANKER_COMMISSION) * rate["banker_wins"],
+        "banker_streaks": totals["banker_streaks"],
+        "player_streaks": totals["player_streaks"],
+        "longest_banker_streak": totals["longest_banker_streak"],
+        "longest_player_streak": totals["longest_player_streak"],
+    }
+
+
+def _simulate_chunk(shoes, decks, cut_card, seed, batch):
+    rng = np.random.default_rng(seed)
+    totals = None
+    while shoes > 0:
+        size = min(batch, shoes)
+        counted = tally(deal_shoes(size, decks, cut_card, rng))
+        totals = counted if totals is None else merge(totals, counted)
+        shoes -= size
+    return totals
+
+
+def simulate(shoes, decks=SIM_DECKS, cut_card=SIM_CUT_CARD, workers=1, seed=None, batch=SIM_BATCH_SHOES):
+    """Deal `shoes` shoes, split over `workers` processes, and return merged tallies."""
+    seeds = np.random.SeedSequence(seed).spawn(workers)
+    chunks = [shoes // workers + (index < shoes % workers) for index in range(workers)]
+    if workers == 1:
+        return _simulate_chunk(chunks[0], decks, cut_card, seeds[0], batch)
+    totals = None
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_simulate_chunk, size, decks, cut_card, child, batch)
+                   for size, child in zip(chunks, seeds) if size]
+        for future in futures:
+            counted = future.result()
+            totals = counted if totals is None else merge(totals, counted)
+    return totals
+
+
+def self_check(shoes=200, seed=7):
+    """Deal a few vectorized shoes again card by card through baccarat_rules.Coup and compare."""
+    results = deal_shoes(shoes, rng=seed)
+    for shoe in range(shoes):
+        cards = results["cards"][shoe]
+        position = 0
+        for hand in range(results["winner"].shape[1]):
+            if results["winner"][shoe, hand] < 0:
+                break
+            coup = Coup()
+            dealt = {PLAYER: [], BANKER: []}
+            while (recipient := coup.next_recipient()) != COMPLETE:
+                code = int(cards[position])
+                position += 1
+                coup.add(recipient, CARD_VALUES[code])
+                dealt[recipient].append(code // 4)
+            player, banker = coup.player_total, coup.banker_total
+            expected = 0 if player > banker else (1 if banker > player else 2)
+            assert results["winner"][shoe, hand] == expected, (shoe, hand)
+            assert results["is_super_six"][shoe, hand] == (banker == 6 and banker > player), (shoe, hand)
+            for side, field in ((PLAYER, "player_pair"), (BANKER, "banker_pair")):
+                pair = len(dealt[side]) == 2 and dealt[side][0] == dealt[side][1]
+                assert results[field][shoe, hand] == pair, (shoe, hand, field)
+        assert len(cards) - position < SIM_CUT_CARD, shoe
+    return shoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Monte Carlo simulation of whole baccarat shoes")
+    parser.add_argument("--shoes", type=int, default=100000)
+    parser.add_argument("--decks", type=int, default=SIM_DECKS)
+    parser.add_argument("--cut-card", type=int, default=SIM_CUT_CARD)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--batch", type=int, default=SIM_BATCH_SHOES)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--check", action="store_true", help="compare against baccarat_rules hand by hand first")
+    args = parser.parse_args()
+
+    if args.check:
+        print(f"Vectorized dealing agrees with baccarat_rules on {self_check()} shoes")
+
+    started = time.perf_counter()
+    totals = simulate(args.shoes, args.decks, args.cut_card, args.workers, args.seed, args.batch)
+    elapsed = time.perf_counter() - started
+    summary = summarize(totals)
+    games = summary["total_games"]
+    print(f"{summary['shoes']} shoes, {games} hands in {elapsed:.2f} s "
+          f"({games / elapsed / 1e6:.2f} M hands/s on {args.workers} worker(s))")
+    for key, value in summary["rates"].items():
+        print(f"  {key:16} {value:.6f}")
+    print(f"  player edge      {summary['player_edge']:.6f}")
+    print(f"  banker edge      {summary['banker_edge']:.6f}")
+    for side in ("banker", "player"):
+        longest = summary[f"longest_{side}_streak"]
+        print(f"  longest {side} streak per shoe: median {int(np.searchsorted(np.cumsum(longest), summary['shoes'] / 2))}, "
+              f"max {int(np.flatnonzero(longest).max())}")
+
+
+if __name__ == "__main__":
+    main()
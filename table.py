@@ -0,0 +1,612 @@
+import logging
+import random
+import time
+
+from baccarat_rules import BANKER, COMPLETE, PLAYER, Coup
+from shoe import CARD_CODES, CARD_VALUES, Shoe, card_name
+
+GAME_MODES = ["manual", "live", "automatic", "vip"]
+WINNERS = ["player", "banker", "tie"]
+CUT_CARD = 52  # below this many cards the shoe is finished: it may be shuffled, and auto-deal reshuffles
+HIDDEN_CARD = "BR"  # shown in VIP mode for a card that has not been revealed yet
+
+
+class GameError(Exception):
+    """The table does not allow this action in its current state. The message is shown to the dealer."""
+
+
+def card_value(card):
+    return CARD_VALUES[CARD_CODES[card]]
+
+def has_pair(cards):
+    return len(cards) == 2 and cards[0][0] == cards[1][0]
+
+def is_valid_card(card):
+    return len(card) == 2 and card[0] in 'A23456789TJQK' and card[1] in 'HDCS'
+
+
+class Table:
+    """One baccarat table: its shoe, the hand being dealt, and the round, mode and burn state.
+
+    The engine API is synchronous and knows nothing about websockets or MongoDB. An action the
+    table does not allow raises GameError. An action that finishes a hand returns the hand's
+    result (the fields save_game_result() stores, plus totals and natural info) for the caller
+    to persist and announce."""
+
+    def __init__(self, decks=8, rng=random):
+        self.shoe = Shoe(decks=decks, rng=rng)
+        self.state = {
+            "round": 0,
+            "game_phase": "waiting",
+            "natural_win": False,
+            "natural_type": None,
+            "can_calculate": False,
+            "burn_mode": "inactive",  # inactive, active, completed
+            "burn_available": False,  # NEW: controls when start burn is enabled
+            "active_players": set(),
+            "auto_dealing": False,
+            "can_manage_players": True,
+            "table_number": "FT-",
+            "max_bet": 100000,
+            "min_bet": 10000,
+            "game_mode": "manual",
+            "vip_player_revealer": None,  # NEW: separate revealers
+            "vip_banker_revealer": None,  # NEW: separate revealers
+            "cards_revealed": False,
+            "winner": None
+        }
+        self.player_cards = []  # Display cards; "BR" for a face-down card in VIP mode
+        self.banker_cards = []
+        self.dummy_player_cards = []  # Real cards behind the display cards in VIP mode
+        self.dummy_banker_cards = []
+        self.coup = Coup()  # Values and running totals of the real cards; drives the drawing rules
+        self.pairs = {"player_pair": False, "banker_pair": False}
+        self.is_super_six = False
+        self.burn_card = None
+        self.burned_cards = []  # Track all burned cards in the current round
+        self.last_card = {"card": None, "recipient": None}
+        self.last_result = None  # the finished hand that undo_result() would take back
+        self.burn_offered = False  # burn is only enabled on the first switch to live/vip
+
+    # --- Queries ---
+
+    def has_unrevealed_cards(self):
+        return HIDDEN_CARD in self.player_cards or HIDDEN_CARD in self.banker_cards
+
+    def next_recipient(self):
+        """PLAYER, BANKER or COMPLETE from the drawing rules, or "no_players" / "waiting_for_reveal"."""
+        if not self.state["auto_dealing"] and len(self.state["active_players"]) == 0:
+            return "no_players"
+
+        # In VIP mode, if we have 4 cards and any are unrevealed, MUST pause
+        if self.coup.cards_dealt == 4 and self.state["game_mode"] == "vip" and self.has_unrevealed_cards():
+            return "waiting_for_reveal"
+
+        return self.coup.next_recipient()
+
+    @property
+    def burning(self):
+        return self.state["burn_mode"] == "active"
+
+    @property
+    def finished(self):
+        """A result is on the table and can still be undone."""
+        return bool(self.last_result) and self.state["game_phase"] == "finished"
+
+    def real_cards(self, side):
+        """The cards used for pairs and results: the dummy lists in VIP mode."""
+        if self.state["game_mode"] == "vip":
+            return self.dummy_player_cards if side == PLAYER else self.dummy_banker_cards
+        return self.player_cards if side == PLAYER else self.banker_cards
+
+    def snapshot(self):
+        """Everything game_state shows about the table, under the keys the clients use."""
+        state = self.state
+        state["cards_revealed"] = not self.has_unrevealed_cards() if state["game_mode"] == "vip" else True
+        next_recipient = self.next_recipient()
+        return {
+            "playerCards": list(self.player_cards),  # Display cards (may contain "BR"), copied so snapshots don't alias
+            "bankerCards": list(self.banker_cards),
+            "playerTotal": self.coup.player_total,  # Totals of the real cards, also in VIP mode
+            "bankerTotal": self.coup.banker_total,
+            "nextCardGoesTo": next_recipient,
+            "gamePhase": state["game_phase"],
+            "playerPair": self.pairs["player_pair"],
+            "bankerPair": self.pairs["banker_pair"],
+            "remainingCards": len(self.shoe),
+            "usedCards": self.shoe.used,
+            "canUndo": len(self.player_cards) > 0 or len(self.banker_cards) > 0 or self.finished,
+            "canCalculate": state["can_calculate"],
+            "canShuffle": state["game_mode"] == "automatic" and len(self.shoe) < CUT_CARD,
+            "burnMode": state["burn_mode"],
+            "burnAvailable": state["burn_available"],
+            "burnCard": self.burn_card,
+            "naturalWin": state["natural_win"],
+            "naturalType": state["natural_type"],
+            "round": state["round"],
+            "activePlayers": list(state["active_players"]),
+            "autoDealingInProgress": state["auto_dealing"],
+            "noPlayersActive": next_recipient == "no_players",
+            "canManagePlayers": state["can_manage_players"],
+            "is_super_six": self.is_super_six,
+            "table_number": state["table_number"],
+            "max_bet": state["max_bet"],
+            "min_bet": state["min_bet"],
+            "game_mode": state["game_mode"],
+            "vip_player_revealer": state["vip_player_revealer"],
+            "vip_banker_revealer": state["vip_banker_revealer"],
+            "cards_revealed": state["cards_revealed"],
+            "winner": state["winner"]
+        }
+
+    # --- Rounds and the shoe ---
+
+    def new_round(self):
+        self.player_cards = []
+        self.banker_cards = []
+        self.dummy_player_cards = []
+        self.dummy_banker_cards = []
+        self.last_card = {"card": None, "recipient": None}
+        self.last_result = None
+        self.pairs = {"player_pair": False, "banker_pair": False}
+        self.is_super_six = False
+        self.coup.reset()
+        self.burned_cards = []
+
+        is_vip_mode = self.state["game_mode"] == "vip"
+        if is_vip_mode:
+            self.state["vip_player_revealer"] = None
+            self.state["vip_banker_revealer"] = None
+        self.state.update({
+            "game_phase": "waiting",
+            "natural_win": False,
+            "natural_type": None,
+            "auto_dealing": False,
+            "cards_revealed": not is_vip_mode,
+            "can_manage_players": True,
+            "winner": None
+        })
+
+    def new_game(self):
+        """Dealer's "new game": clear the hand for the next round."""
+        if self.state["auto_dealing"]:
+            raise GameError("Cannot start new game during auto-dealing")
+        self.new_round()
+
+    def reset(self):
+        """Fresh shoe, round 0 and no active players."""
+        if self.state["auto_dealing"]:
+            raise GameError("Cannot reset during auto-dealing")
+        self.shoe.shuffle()
+        self.burn_card = None
+        self.new_round()
+        self.state["active_players"] = set()
+        self.state.update({
+            "round": 0,
+            "burn_mode": "inactive",
+            "burn_available": True,  # Enable burn after reset
+            "can_manage_players": True
+        })
+
+    def reshuffle(self):
+        self.shoe.shuffle()
+        self.state["burn_mode"] = "inactive"
+        self.state["burn_available"] = True  # Enable burn after shuffle
+        logging.info(f"Deck shuffled - {len(self.shoe)} cards available")
+
+    def shuffle(self):
+        """Dealer's shuffle button. In automatic mode only once the shoe reached the cut card."""
+        if self.state["auto_dealing"]:
+            raise GameError("Cannot shuffle manually during auto-dealing")
+        if self.state["game_mode"] == "automatic" and len(self.shoe) >= CUT_CARD:
+            raise GameError("Too many cards remaining to shuffle")
+        self.reshuffle()
+
+    # --- Burning ---
+
+    def start_burn(self):
+        if self.state["auto_dealing"]:
+            raise GameError("Cannot start burn during auto-dealing")
+        if not self.state["burn_available"]:
+            raise GameError("Burn card not available")
+        if self.state["burn_mode"] != "inactive":
+            raise GameError("Burn mode already active")
+        self.state["burn_mode"] = "active"
+        self.state["burn_available"] = False  # Immediately disable Start Burn button
+        logging.info("Burn mode activated")
+
+    def end_burn(self):
+        if self.state["burn_mode"] != "active":
+            self.state["burn_available"] = False  # Always disable End Burn button on click
+            raise GameError("Burn mode not active")
+        self.state["burn_mode"] = "completed"
+        self.state["burn_available"] = False  # Immediately disable End Burn button
+        logging.info("Burn mode ended.")
+
+    def burn(self, card):
+        """Burn a card reported while burn mode is active. Burn mode stays on until end_burn()."""
+        if self.state["auto_dealing"]:
+            raise GameError("Cannot burn cards manually during auto-dealing")
+        if not card or not is_valid_card(card) or self.shoe.count(CARD_CODES[card]) == 0:
+            raise GameError(f"Invalid burn card: {card}")
+        self.shoe.remove(CARD_CODES[card])
+        self.burned_cards.append(card)
+        self.burn_card = card
+        logging.info(f"Card burned: {card}")
+
+    # --- Dealing ---
+
+    def add_card(self, card):
+        """Deal a card reported by the dealer or the shoe reader to whoever is due one.
+        Returns the hand's result if this card finished it, else None."""
+        if self.state["auto_dealing"]:
+            raise GameError("Cannot add cards manually during auto-dealing")
+        if not card or not is_valid_card(card) or self.shoe.count(CARD_CODES[card]) == 0:
+            raise GameError(f"Invalid card: {card}")
+
+        recipient = self.next_recipient()
+        if recipient == "no_players":
+            raise GameError("No active players - cannot deal cards")
+        if recipient == "waiting_for_reveal":
+            raise GameError("Cannot add more cards until current cards are revealed")
+        if recipient == COMPLETE:
+            raise GameError("Cannot add more cards")
+
+        self.shoe.remove(CARD_CODES[card])
+        if self._place(card, recipient) and self.next_recipient() == COMPLETE:
+            return self.result()
+        return None
+
+    def _place(self, card, recipient):
+        """Put a card that already left the shoe on the table. False if the hand now waits for a VIP reveal."""
+        state = self.state
+        if state["game_mode"] == "vip":
+            # The real card goes to the dummy list, the clients see "BR" until it is revealed
+            if recipient == PLAYER:
+                self.dummy_player_cards.append(card)
+                self.player_cards.append(HIDDEN_CARD)
+            else:
+                self.dummy_banker_cards.append(card)
+                self.banker_cards.append(HIDDEN_CARD)
+        elif recipient == PLAYER:
+            self.player_cards.append(card)
+        else:
+            self.banker_cards.append(card)
+        self.coup.add(recipient, card_value(card))
+        self.last_card = {"card": card, "recipient": recipient}
+
+        # Once the first card is dealt to player, disable burn buttons
+        if recipient == PLAYER and len(self.player_cards) == 1:
+            state["burn_available"] = False
+            state["burn_mode"] = "completed"
+        if len(self.player_cards) + len(self.banker_cards) == 1:
+            state["can_manage_players"] = False
+            logging.info("Player management disabled - cards being dealt")
+
+        cards = self.real_cards(recipient)
+        if len(cards) == 2:
+            self.pairs[f"{recipient}_pair"] = has_pair(cards)
+            logging.info(f"{recipient.capitalize()} pair detected: {cards} -> {self.pairs[f'{recipient}_pair']}")
+
+        total_cards = self.coup.cards_dealt
+        # VIP logic to pause after 4 cards (and after each third card) for reveal
+        if total_cards >= 4 and state["game_mode"] == "vip" and self.has_unrevealed_cards():
+            state["game_phase"] = "waiting_for_reveal"
+            state["can_calculate"] = False  # Cannot calculate until reveal
+            return False
+
+        if total_cards == 4 and state["game_mode"] != "vip":
+            state["can_calculate"] = True
+            self._check_natural()
+        return True
+
+    def _check_natural(self):
+        player_score, banker_score = self.coup.player_total, self.coup.banker_total
+        if player_score >= 8 or banker_score >= 8:
+            self.state["natural_win"] = True
+            self.state["natural_type"] = "natural_9" if (player_score == 9 or banker_score == 9) else "natural_8"
+        else:
+            self.state["natural_win"] = False
+            self.state["natural_type"] = None
+
+    def start_auto_deal(self):
+        if self.state["auto_dealing"]:
+            raise GameError("Auto-dealing already in progress")
+        if len(self.state["active_players"]) == 0:
+            raise GameError("Cannot auto-deal: No active players.")
+        if len(self.player_cards) > 0 or len(self.banker_cards) > 0:
+            raise GameError("Please start a new game before auto-dealing")
+        self.state["auto_dealing"] = True
+        self.state["game_phase"] = "auto_dealing"
+        self.state["can_manage_players"] = False
+
+    def deal(self):
+        """Auto-deal one card off the front of the shoe. Returns (card, recipient), or None when the
+        hand needs no more cards (or waits for a VIP reveal); the result is left to finish_auto_deal()."""
+        recipient = self.next_recipient()
+        if recipient not in (PLAYER, BANKER):
+            return None
+        if len(self.shoe) == 0:
+            raise GameError("No cards available to deal")
+        card = card_name(self.shoe.draw())
+        self._place(card, recipient)
+        return card, recipient
+
+    def finish_auto_deal(self):
+        """Settle the auto-dealt hand. Returns its result, or None if it is not complete."""
+        result = self.result() if self.next_recipient() == COMPLETE else None
+        self.state["auto_dealing"] = False
+        self.state["game_phase"] = "finished"
+        if self.last_result:
+            self.last_result["auto_deal"] = True  # undo is not allowed after auto-deal
+        return result
+
+    def abort_auto_deal(self):
+        self.state["auto_dealing"] = False
+        self.state["game_phase"] = "waiting"
+
+    # --- VIP reveal ---
+
+    def reveal(self, side, *positions):
+        """Turn over face-down VIP cards on one side (0-based positions). Returns the hand's result
+        if the last face-down card was turned and the hand needs no more cards."""
+        self._turn_over(side, positions)
+        return self._after_reveal()
+
+    def final_reveal(self):
+        """Dealer turns over the first two cards of both sides."""
+        if self.state["game_mode"] != "vip":
+            raise GameError("Final reveal only available in VIP mode")
+        if self.state["game_phase"] != "waiting_for_reveal":
+            raise GameError("Final reveal can only be triggered during waiting_for_reveal phase")
+        self._turn_over(PLAYER, (0, 1))
+        self._turn_over(BANKER, (0, 1))
+        return self._after_reveal()
+
+    def _turn_over(self, side, positions):
+        cards, hidden = (self.player_cards, self.dummy_player_cards) if side == PLAYER else (self.banker_cards, self.dummy_banker_cards)
+        for position in positions:
+            if position >= len(hidden):
+                raise GameError(f"No {side} card {position + 1} to reveal")
+        for position in positions:
+            cards[position] = hidden[position]
+
+    def _after_reveal(self):
+        if self.has_unrevealed_cards():
+            return None
+        if self.next_recipient() == COMPLETE:
+            return self.result()
+        # Set to waiting to allow more cards
+        self.state["game_phase"] = "waiting"
+        self.state["can_calculate"] = True
+        return None
+
+    def set_vip_revealer(self, player_id, revealer_type):
+        """Scenarios for a table of 6 players and the dealer:
+        1. Player selects player_revealer -> Dealer becomes banker_revealer
+        2. Player selects banker_revealer -> Dealer becomes player_revealer
+        3. Two different players selected as revealers -> No dealer involvement
+        Returns the message for the dealer."""
+        state = self.state
+        if state["game_mode"] != "vip":
+            raise GameError("VIP revealer can only be set in VIP mode")
+        if player_id not in state["active_players"]:
+            raise GameError("Player must be active to be a revealer")
+        other_type = BANKER if revealer_type == PLAYER else PLAYER
+        if player_id == state[f"vip_{other_type}_revealer"]:
+            raise GameError(f"Player {player_id} is already the {other_type} revealer")
+
+        state[f"vip_{revealer_type}_revealer"] = player_id
+        if state[f"vip_{other_type}_revealer"] is None:
+            state[f"vip_{other_type}_revealer"] = "dealer"
+            return f"Player {player_id} set as {revealer_type} revealer, dealer set as {other_type} revealer"
+        return f"Player {player_id} set as {revealer_type} revealer"
+
+    # --- Results ---
+
+    def result(self):
+        """Settle the hand on the table and return its result."""
+        state = self.state
+        player_score = self.coup.player_total
+        banker_score = self.coup.banker_total
+
+        if state["game_mode"] == "vip" and self.coup.cards_dealt == 4:
+            self._check_natural()
+
+        is_super_six = banker_score == 6 and banker_score > player_score
+        calc_player_cards = self.real_cards(PLAYER)
+        calc_banker_cards = self.real_cards(BANKER)
+        player_pair = len(calc_player_cards) == 2 and has_pair(calc_player_cards)
+        banker_pair = len(calc_banker_cards) == 2 and has_pair(calc_banker_cards)
+        self.is_super_six = is_super_six
+
+        is_natural = state["natural_win"]
+        player_natural = is_natural and player_score >= 8 and player_score > banker_score
+        banker_natural = is_natural and banker_score >= 8 and banker_score > player_score
+
+        if player_score > banker_score:
+            winner = "player"
+        elif banker_score > player_score:
+            winner = "banker"
+        else:
+            winner = "tie"
+
+        previous_state = {"round": state["round"]}
+        state["round"] += 1
+        state["winner"] = winner
+        state["game_phase"] = "finished"
+        state["can_calculate"] = False
+        self.last_result = {
+            "winner": winner,
+            "is_super_six": is_super_six,
+            "player_natural": player_natural,
+            "banker_natural": banker_natural,
+            "previous_state": previous_state
+        }
+        return {
+            "round": state["round"],
+            "winner": winner,
+            "is_super_six": is_super_six,
+            "player_pair": player_pair,
+            "banker_pair": banker_pair,
+            "player_natural": player_natural,
+            "banker_natural": banker_natural,
+            "player_total": player_score,
+            "banker_total": banker_score,
+            "is_natural": is_natural,
+            "natural_type": state["natural_type"]
+        }
+
+    def manual_result(self, winner, is_super_six=False, player_pair=False, banker_pair=False, player_natural=False, banker_natural=False):
+        """Record a result the dealer entered by hand (manual mode only)."""
+        if self.state["game_mode"] != "manual":
+            raise GameError("Manual result only allowed in manual mode")
+        if self.state["auto_dealing"]:
+            raise GameError("Cannot enter a manual result during auto-dealing")
+        # Reinitialize round for manual mode (since no explicit new_round)
+        self.new_round()
+        if winner not in WINNERS:
+            raise GameError("Invalid winner")
+        self.state["round"] += 1
+        self.state["game_phase"] = "finished"
+        self.state["winner"] = winner
+        return {
+            "round": self.state["round"],
+            "winner": winner,
+            "is_super_six": is_super_six,
+            "player_pair": player_pair,
+            "banker_pair": banker_pair,
+            "player_natural": player_natural,
+            "banker_natural": banker_natural
+        }
+
+    def forget_result(self, round_num):
+        """A stored result was deleted; step the round counter back if it was the current round."""
+        if round_num != self.state["round"]:
+            return False
+        self.state["round"] = max(0, self.state["round"] - 1)
+        return True
+
+    # --- Undo ---
+
+    def check_undo(self):
+        # Block undo after auto-deal (auto_dealing just finished)
+        if self.last_result and self.last_result.get("auto_deal", False):
+            raise GameError("Undo is not allowed after auto-deal. Please reset or start a new game.")
+        if self.state["auto_dealing"]:
+            raise GameError("Cannot undo during auto-dealing")
+
+    def undo_result(self):
+        """Take back the finished hand's result (the caller removes the stored copy) and its last card."""
+        self.check_undo()
+        state = self.state
+        state.update(self.last_result["previous_state"])
+        state["game_phase"] = "waiting"
+        state["can_calculate"] = True
+        state["natural_win"] = False
+        state["natural_type"] = None
+        # Remove last card dealt (from player or banker)
+        recipient = self._last_recipient()
+        if recipient:
+            self._return_card(recipient)
+        self.last_result = None
+
+    def undo(self):
+        """Take back the last card dealt. Returns (card as shown, recipient)."""
+        self.check_undo()
+        recipient = self._last_recipient()
+        if recipient is None:
+            raise GameError("No cards to undo")
+        shown = self._return_card(recipient)
+
+        state = self.state
+        self.pairs["player_pair"] = len(self.player_cards) == 2 and has_pair(self.player_cards)
+        self.pairs["banker_pair"] = len(self.banker_cards) == 2 and has_pair(self.banker_cards)
+        total_cards = len(self.player_cards) + len(self.banker_cards)
+        if total_cards < 4:
+            state.update({
+                "natural_win": False,
+                "natural_type": None,
+                "can_calculate": False,
+                "game_phase": "waiting"
+            })
+        elif total_cards == 4:
+            self._check_natural()
+            state["can_calculate"] = True
+            state["game_phase"] = "waiting"
+        if total_cards == 0:
+            state["can_manage_players"] = True
+        logging.info(f"Undid card: {shown} from {recipient}")
+        return shown, recipient
+
+    def _last_recipient(self):
+        # Dealing order is P B P B, then the player's third card before the banker's
+        if len(self.player_cards) > len(self.banker_cards):
+            return PLAYER
+        if self.banker_cards:
+            return BANKER
+        return None
+
+    def _return_card(self, side):
+        """Take the side's last card off the table and put it back in the shoe. Returns it as shown."""
+        shown = (self.player_cards if side == PLAYER else self.banker_cards).pop()
+        card = shown
+        # In VIP mode the shown card may be a "BR" placeholder; the real one is in the dummy list
+        hidden = self.dummy_player_cards if side == PLAYER else self.dummy_banker_cards
+        if self.state["game_mode"] == "vip" and hidden:
+            card = hidden.pop()
+        if card in CARD_CODES:
+            self.shoe.undo(CARD_CODES[card])
+        self.coup.pop(side)
+        self.last_card = {"card": None, "recipient": None}
+        return shown
+
+    # --- Settings ---
+
+    def set_mode(self, mode):
+        if mode not in GAME_MODES:
+            raise GameError("Invalid game mode")
+        if self.state["auto_dealing"]:
+            raise GameError("Cannot change game mode during auto-dealing")
+        old_mode = self.state["game_mode"]
+        self.state["game_mode"] = mode
+        # Enable burn ONLY on first switch to live/vip mode
+        if old_mode in ("manual", "automatic") and mode in ("live", "vip") and not self.burn_offered:
+            self.state["burn_available"] = True
+            logging.info(f"Burn enabled for first switch to {mode} mode")
+            self.burn_offered = True
+        self.state["vip_player_revealer"] = None
+        self.state["vip_banker_revealer"] = None
+        self.state["cards_revealed"] = mode != "vip"
+
+    def set_player(self, player_id, is_active):
+        if not self.state["can_manage_players"]:
+            raise GameError("Cannot add/remove players while a round is in progress. Start a new game to manage players.")
+        if is_active:
+            self.state["active_players"].add(player_id)
+        else:
+            self.state["active_players"].discard(player_id)
+
+
+def play_rounds(table, rounds):
+    """Auto-deal `rounds` complete hands in-process, reshuffling at the cut card. Returns the results."""
+    results = []
+    for _ in range(rounds):
+        if len(table.shoe) < CUT_CARD:
+            table.reshuffle()
+        table.new_round()
+        table.start_auto_deal()
+        while table.deal():
+            pass
+        results.append(table.finish_auto_deal())
+    return results
+
+
+if __name__ == "__main__":
+    table = Table()
+    table.set_player("1", True)
+    rounds = 20000
+    started = time.perf_counter()
+    play_rounds(table, rounds)
+    elapsed = time.perf_counter() - started
+    print(f"{rounds} rounds in {elapsed:.2f} s ({rounds / elapsed:.0f} rounds/s)")
@@ -0,0 +1,185 @@
+import asyncio
+import json
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import server
+from shoe_protocol import BURN, Frame
+
+
+class FakeDatabase:
+    """The DatabaseGateway calls the journal makes, against a list instead of MongoDB."""
+
+    def __init__(self, name="game_results_test"):
+        self.docs = []
+        self.collection = type("Collection", (), {"name": name})()
+
+    async def find_one(self, query, sort=None):
+        excluded = query.get("_id", {}).get("$nin", [])
+        docs = [doc for doc in self.docs if doc["_id"] not in excluded]
+        return max(docs, key=lambda doc: doc["timestamp"]) if docs else None
+
+    async def stored_ids(self, ids):
+        return {doc["_id"] for doc in self.docs if doc["_id"] in ids}
+
+    async def aggregate(self, pipeline):
+        counts = dict.fromkeys(server.StatsAggregator.FIELDS, 0)
+        for doc in self.docs:
+            for field, hit in server.StatsAggregator.contributions(doc).items():
+                counts[field] += hit
+        return [counts]
+
+    async def insert_many(self, docs):
+        self.docs.extend(docs)
+
+    async def delete_one(self, query):
+        self.docs = [doc for doc in self.docs if doc["_id"] != query["_id"]]
+
+    async def delete_many(self, query):
+        self.docs = []
+
+
+def test_latest_finds_rounds_evicted_from_recent_stored(tmp_path):
+    async def run():
+        database = FakeDatabase()
+        wal = server.WriteAheadLog(str(tmp_path / "results.wal"))
+        wal.open()
+        journal = server.WriteBehindJournal(database, wal)
+        journal.clear()
+        await journal.flush()
+        rounds = server.RECENT_STORED_CACHE + 10
+        for round_num in range(rounds):
+            journal.insert({"timestamp": round_num, "round": round_num})
+        await journal.flush()
+
+        deleted = []
+        for _ in range(rounds):
+            doc = await journal.latest()
+            assert doc is not None, f"latest() lost the round after {len(deleted)} deletes"
+            deleted.append(doc["round"])
+            journal.delete(doc)
+            await journal.flush()
+        assert deleted == list(reversed(range(rounds)))
+        assert database.docs == []
+        assert await journal.latest() is None
+
+    asyncio.run(run())
+
+
+def test_stats_load_skips_journal_entries_mongodb_already_applied(tmp_path):
+    async def run():
+        database = FakeDatabase()
+        acked, queued, removed, kept = ({"_id": name, "winner": "banker", "timestamp": 0}
+                                        for name in ("acked", "queued", "removed", "kept"))
+        database.docs = [acked, kept, {"_id": "older", "winner": "player", "timestamp": 0}]
+        journal = server.WriteBehindJournal(database, server.WriteAheadLog(str(tmp_path / "results.wal")))
+        # What restore() rebuilds when the crash hit after MongoDB acknowledged some of the WAL
+        journal.pending.extend([("insert", acked), ("insert", queued), ("delete", removed), ("delete", kept)])
+
+        stats = server.StatsAggregator()
+        await stats.load(database, journal.unstored)
+        assert stats.counts["total_games"] == 3  # older, acked, queued; kept is about to be deleted
+        assert stats.counts["banker_wins"] == 2
+        assert stats.counts["player_wins"] == 1
+
+    asyncio.run(run())
+
+
+def test_postponed_setup_runs_after_the_first_flush(tmp_path):
+    async def run():
+        database = FakeDatabase()
+        journal = server.WriteBehindJournal(database, server.WriteAheadLog(str(tmp_path / "results.wal")))
+        ready = asyncio.Event()
+
+        async def on_ready():
+            ready.set()
+
+        journal.on_ready = on_ready
+        journal.insert({"winner": "tie", "timestamp": 0})
+        journal.start()
+        await asyncio.wait_for(ready.wait(), 1)
+        assert len(database.docs) == 1 and not journal.pending
+        journal.task.cancel()
+
+    asyncio.run(run())
+
+
+class FakeWebSocket:
+    """A client connection that sends `messages` right after connecting, stays connected for one
+    admission window and records everything it gets."""
+
+    def __init__(self, table_id, messages=()):
+        self.path = f"/{table_id}"
+        self.request = None
+        self.remote_address = ("test", 0)
+        self.messages = [json.dumps(message) for message in messages]
+        self.sent = []
+
+    async def send(self, payload):
+        self.sent.append(json.loads(payload))
+
+    async def close(self):
+        pass
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.messages:
+            await asyncio.sleep(server.ADMISSION_WINDOW * 2)
+            raise StopAsyncIteration
+        return self.messages.pop(0)
+
+
+def test_resume_on_a_fresh_connection_gets_only_the_missed_frames(monkeypatch):
+    async def run():
+        host = server.TableHost("resume-test", FakeDatabase())
+        monkeypatch.setitem(server.table_hosts, host.table_id, host)
+        for number in range(5):
+            await host.broadcast({"action": "note", "number": number})
+        last_seq = host.seq - 3
+
+        websocket = FakeWebSocket(host.table_id, [{"action": "resume", "last_seq": last_seq}])
+        await server.handle_client(websocket)
+        assert websocket.sent[0] == {"action": "resume", "snapshot": False, "replayed": 3, "seq": host.seq}
+        assert websocket.sent[1:] == [{"action": "note", "number": number, "seq": last_seq + number - 1}
+                                      for number in (2, 3, 4)]
+
+        rejected = FakeWebSocket(host.table_id, [{"action": "resume", "last_seq": "soon"}])
+        await server.handle_client(rejected)
+        # A rejected resume leaves the client waiting for admission like any new client
+        assert [message["action"] for message in rejected.sent[:2]] == ["error", "game_state"]
+
+    asyncio.run(run())
+
+
+class FakeSerial:
+    """A serial port returning `reads` one per read() (b"" being a read that timed out), then
+    blocking as an idle port would."""
+
+    name = "fake"
+    in_waiting = 0
+
+    def __init__(self, reads):
+        self.reads = list(reads)
+        self.idle = threading.Event()
+
+    def read(self, size):
+        if self.reads:
+            return self.reads.pop(0)
+        self.idle.wait()
+        return b""
+
+
+def test_shoe_reader_keeps_a_burn_header_across_an_idle_read():
+    async def run():
+        ser = FakeSerial([b"[Manual Burn Cards]", b"", b"<Card:7H>\r\n"])
+        reader = server.ShoeReader(ser, asyncio.get_running_loop())
+        reader.start()
+        frames, _ = await asyncio.wait_for(reader.batches.get(), 1)
+        assert frames == [Frame(BURN, "7H", "Manual Burn Cards")]
+
+    asyncio.run(run())
@@ -0,0 +1,22 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shoe_protocol import BURN, SHOE_END, Frame, ShoeParser, self_check
+
+
+def test_chunked_parsing_matches_the_synthetic_capture():
+    assert self_check(frames=2000)
+
+
+def test_header_waits_for_its_card_in_a_later_read():
+    parser = ShoeParser()
+    assert parser.feed(b"[Manual Burn Cards]") == []
+    assert parser.feed(b"<Card:7H>\r\n") == [Frame(BURN, "7H", "Manual Burn Cards")]
+
+
+def test_event_header_is_reported_at_the_end_of_its_line():
+    parser = ShoeParser()
+    assert parser.feed(b"[Shoe End]") == []
+    assert parser.feed(b"\r\n") == [Frame(SHOE_END, None, "Shoe End")]